@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+""" Micro-benchmark of the representation of a chunk in import_document
+
+Compare the columnar chunk (``read_columns``, ``ColumnarChunk.from_columns``
+then ``rows()``) with the dense rows of ``iter_rows`` followed by the
+former ``convert_import_data``, on wide and tall chunks read from a fake
+sheet. Both must give the same rows to load; the memory column is the
+size of the containers alive when ``load()`` is called (the cell values,
+shared by both, are not counted)::
+
+    python benchmarks/bench_chunk_columnar.py
+"""
+
+import imp
+import itertools
+import operator
+import os
+import random
+import sys
+import timeit
+
+ADDON = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     os.pardir, 'connector_google_spreadsheet')
+columnar = imp.load_source('columnar', os.path.join(ADDON, 'columnar.py'))
+reader = imp.load_source('reader', os.path.join(ADDON, 'reader.py'))
+
+
+class Cell(object):
+    __slots__ = ('row', 'col', 'value')
+
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeSheet(object):
+    """ Cells of a chunk, returned by ``range`` as a Google sheet does """
+
+    def __init__(self, cells, cols):
+        self.cells = cells
+        self.cols = cols
+
+    def get_addr_int(self, row, col):
+        return '%s,%s' % (row, col)
+
+    def range(self, label):
+        row_start, __, row_end, __ = map(
+            int, label.replace(':', ',').split(','))
+        return self.cells[(row_start - 1) * self.cols:row_end * self.cols]
+
+
+def legacy_convert_import_data(rows_to_import, fields):
+    """ convert_import_data before the columnar chunk """
+    indices = [index for index, field in enumerate(fields) if field]
+
+    if len(indices) == 1:
+        mapper = lambda row: [row[indices[0]]]
+    else:
+        mapper = operator.itemgetter(*indices)
+
+    import_fields = filter(None, fields)
+    filter_row = False
+    if 'skip_import' in import_fields:
+        skip_import = import_fields.index('skip_import')
+        filter_row = True
+
+    data = []
+    original_position = {}
+    row_number = -1
+    for row in itertools.imap(mapper, rows_to_import):
+        row_number += 1
+        if any(row):
+            if filter_row:
+                if row[skip_import]:
+                    continue
+                else:
+                    row = list(row)
+                    row.pop(skip_import)
+            original_position[len(data)] = row_number
+            data.append(row)
+    if filter_row:
+        import_fields.remove('skip_import')
+    return data, import_fields, original_position
+
+
+def make_chunk(rows, cols, rnd):
+    """ Cells of a chunk (rows 1..rows) and the field of each column: a
+        few unknown headers, a skip_import column, blank cells and rows
+    """
+    fields = ['field_%s' % col for col in range(cols)]
+    for col in range(3, cols, 10):
+        fields[col] = False
+    fields[-1] = 'skip_import'
+    cells = []
+    for row in range(1, rows + 1):
+        blank_row = rnd.random() < 0.05
+        skipped = rnd.random() < 0.05
+        for col in range(1, cols + 1):
+            if col == cols:
+                value = 'x' if skipped else ''
+            elif blank_row or rnd.random() < 0.2:
+                value = ''
+            else:
+                value = 'v%s' % rnd.randint(0, 50)
+            cells.append(Cell(row, col, value))
+    return cells, fields
+
+
+def container_size(value):
+    """ Size of the containers (not of the shared cell values) """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(container_size(key) + container_size(item)
+                    for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(container_size(item) for item in value
+                    if isinstance(item, (list, tuple, dict)))
+    elif isinstance(value, columnar.ColumnarChunk):
+        size += sum(container_size(item) for item in
+                    (value.columns, value.fields, value.valid,
+                     value.positions, value.group_flags))
+    return size
+
+
+def run_legacy(sheet, rows, cols, fields):
+    dense = list(reader.iter_rows(sheet, 1, rows, 1, cols))
+    data, import_fields, positions = legacy_convert_import_data(dense,
+                                                                fields)
+    return (dense, data, positions), data, import_fields, positions
+
+
+def run_columnar(sheet, rows, cols, fields):
+    wanted = [not index or bool(field) for index, field in enumerate(fields)]
+    columns = reader.read_columns(sheet, 1, rows, 1, cols, wanted=wanted)
+    chunk = columnar.ColumnarChunk.from_columns(columns, fields)
+    data = chunk.rows()
+    # (the columns without field are alive until the chunk is built)
+    return (columns, chunk, data), data, chunk.fields, chunk.positions
+
+
+def check_same_result(sheet, rows, cols, fields):
+    __, data, import_fields, positions = run_legacy(sheet, rows, cols,
+                                                    fields)
+    __, new_data, new_fields, new_positions = run_columnar(
+        sheet, rows, cols, fields)
+    assert [tuple(row) for row in data] == new_data
+    assert import_fields == new_fields
+    assert [positions[i] for i in range(len(data))] == list(new_positions)
+
+
+def bench(func, sheet, rows, cols, fields, repeat=9):
+    return min(timeit.repeat(lambda: func(sheet, rows, cols, fields),
+                             number=1, repeat=repeat))
+
+
+def main():
+    rnd = random.Random(42)
+    print('%-6s %6s %5s %12s %12s %14s %14s' % (
+        'chunk', 'rows', 'cols', 'legacy (s)', 'columnar (s)',
+        'legacy (KiB)', 'columnar (KiB)'))
+    for name, rows, cols in (('wide', 500, 150), ('wide', 1000, 300),
+                             ('tall', 20000, 8), ('tall', 50000, 12)):
+        cells, fields = make_chunk(rows, cols, rnd)
+        sheet = FakeSheet(cells, cols)
+        check_same_result(sheet, rows, cols, fields)
+        legacy = bench(run_legacy, sheet, rows, cols, fields)
+        new = bench(run_columnar, sheet, rows, cols, fields)
+        legacy_size = container_size(
+            run_legacy(sheet, rows, cols, fields)[0]) / 1024
+        new_size = container_size(
+            run_columnar(sheet, rows, cols, fields)[0]) / 1024
+        print('%-6s %6d %5d %12.4f %12.4f %14d %14d' % (
+            name, rows, cols, legacy, new, legacy_size, new_size))
+    print('both representations give the same rows to load')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+""" Micro-benchmark of the chunk planner of run()
+
+Compare ``plan_chunks`` with the boundary loop it replaced, check that
+both produce the same ranges and show how planning time grows with the
+number of rows::
+
+    python benchmarks/bench_chunk_planner.py
+"""
+
+import imp
+import os
+import random
+import timeit
+
+ADDON = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     os.pardir, 'connector_google_spreadsheet')
+chunking = imp.load_source('chunking', os.path.join(ADDON, 'chunking.py'))
+
+
+def legacy_plan_chunks(cells, first_row, data_row_start, eof, chunk_size):
+    """ Chunk loop of run() before the planner was extracted """
+    ranges = []
+    row_start = first_row
+    row_end = row_start
+    indexes = [i - 1 for i, cell in enumerate(cells) if cell and i]
+
+    def cut_allowed(index, indexes):
+        return index in indexes or index >= max(indexes or [0])
+
+    for i, cell in enumerate(cells):
+        if row_start < data_row_start:
+            row_start += 1
+            row_end = row_start
+            continue
+        size = row_end - row_start + 1
+        if cut_allowed(i, indexes) \
+                and size >= chunk_size or row_end == eof:
+            ranges.append((row_start, row_end))
+            if row_end == eof:
+                break
+            row_end += 1
+            row_start = row_end
+        else:
+            row_end += 1
+    return ranges
+
+
+def make_cells(rows, child_ratio, rnd):
+    """ First column values: blank cells are one2many children """
+    return ['x%s' % i if i == 0 or rnd.random() >= child_ratio else ''
+            for i in range(rows)]
+
+
+def check_same_ranges(rnd):
+    for __ in range(2000):
+        rows = rnd.randint(1, 60)
+        cells = make_cells(rows, rnd.choice([0, 0.3, 0.8]), rnd)
+        header_row = rnd.randint(1, 3)
+        first_row = header_row + 1
+        data_row_start = rnd.randint(2, first_row + rows)
+        eof = header_row + rows
+        if rnd.random() < 0.3:
+            eof = min(eof, rnd.randint(data_row_start, eof + 2))
+        chunk_size = rnd.choice([0, 1, 2, 5, 100])
+        params = (cells, first_row, data_row_start, eof, chunk_size)
+        expected = legacy_plan_chunks(*params)
+        result = chunking.plan_chunks(*params)
+        assert result == expected, (params, expected, result)
+
+
+def bench(func, cells, repeat=3):
+    params = (cells, 2, 2, len(cells) + 1, 100)
+    return min(timeit.repeat(lambda: func(*params), number=1, repeat=repeat))
+
+
+def main():
+    rnd = random.Random(42)
+    check_same_ranges(rnd)
+    print('plan_chunks and legacy loop produce the same ranges')
+    print('%10s %14s %14s' % ('rows', 'legacy (s)', 'planner (s)'))
+    for rows in (1000, 5000, 10000, 20000, 50000, 100000):
+        cells = make_cells(rows, 0.5, rnd)
+        legacy = bench(legacy_plan_chunks, cells) if rows <= 20000 else None
+        planner = bench(chunking.plan_chunks, cells)
+        print('%10d %14s %14.5f' % (
+            rows, '%.5f' % legacy if legacy is not None else 'skipped',
+            planner))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+""" Benchmark of the location of the end of data of a sheet in run()
+
+Compare the scan of all the rows up to ``row_count`` (the former way)
+with ``find_data_end`` locating the blank tail by probes followed by the
+scan of the data rows only, on a fake sheet with large blank tails. The
+fake sheet counts the requests and the cells they return; a probe
+returns at most one cell, as the Google cells feed without
+``return-empty``. Both must find the same rows::
+
+    python benchmarks/bench_eof.py
+"""
+
+import imp
+import os
+import random
+import time
+
+ADDON = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     os.pardir, 'connector_google_spreadsheet')
+reader = imp.load_source('reader', os.path.join(ADDON, 'reader.py'))
+
+
+class Cell(object):
+    __slots__ = ('row', 'col', 'value')
+
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeSheet(object):
+    """ Data rows followed by ``blank_rows`` blank rows """
+
+    def __init__(self, grid, blank_rows):
+        self.grid = grid
+        self.row_count = len(grid) + blank_rows
+        self.requests = 0
+        self.cells = 0
+
+    def get_addr_int(self, row, col):
+        return '%s,%s' % (row, col)
+
+    def _value(self, row, col):
+        if row <= len(self.grid) and col <= len(self.grid[row - 1]):
+            return self.grid[row - 1][col - 1]
+        return ''
+
+    def range(self, label):
+        row_start, col_start, row_end, col_end = map(
+            int, label.replace(':', ',').split(','))
+        self.requests += 1
+        self.cells += (row_end - row_start + 1) * (col_end - col_start + 1)
+        return [Cell(row, col, self._value(row, col))
+                for row in range(row_start, row_end + 1)
+                for col in range(col_start, col_end + 1)]
+
+    def has_values(self, row_start, row_end, col_start, col_end):
+        self.requests += 1
+        for row in range(row_start, min(row_end, len(self.grid)) + 1):
+            for col in range(col_start, col_end + 1):
+                if self._value(row, col):
+                    self.cells += 1
+                    return True
+        return False
+
+
+def make_grid(rows, cols, rnd):
+    """ Data rows with blank cells and a few blank rows """
+    grid = []
+    for __ in range(rows):
+        if rnd.random() < 0.02:
+            grid.append([''] * cols)
+        else:
+            grid.append(['v%s' % rnd.randint(0, 50)
+                         if rnd.random() > 0.2 else ''
+                         for __ in range(cols)])
+    grid[-1][0] = 'last'
+    return grid
+
+
+def full_scan(sheet, cols):
+    return reader.scan_data_rows(
+        reader.iter_rows(sheet, 2, sheet.row_count, 1, cols))
+
+
+def probed_scan(sheet, cols):
+    data_end = reader.find_data_end(
+        2, sheet.row_count,
+        lambda start, stop: sheet.has_values(start, stop, 1, cols))
+    return reader.scan_data_rows(
+        reader.iter_rows(sheet, 2, data_end, 1, cols))
+
+
+def measure(func, grid, blank_rows, cols):
+    sheet = FakeSheet(grid, blank_rows)
+    start = time.time()
+    result = func(sheet, cols)
+    return result, time.time() - start, sheet.requests, sheet.cells
+
+
+def main():
+    rnd = random.Random(42)
+    print('%6s %5s %7s | %8s %5s %9s | %8s %5s %9s' % (
+        'rows', 'cols', 'blank', 'scan (s)', 'reqs', 'cells',
+        'probe (s)', 'reqs', 'cells'))
+    for rows, cols, blank_rows in ((2000, 20, 0), (2000, 20, 1000),
+                                   (2000, 20, 20000), (10000, 10, 100000),
+                                   (500, 60, 50000)):
+        grid = make_grid(rows, cols, rnd)
+        old, old_time, old_requests, old_cells = measure(
+            full_scan, grid, blank_rows, cols)
+        new, new_time, new_requests, new_cells = measure(
+            probed_scan, grid, blank_rows, cols)
+        assert old == new
+        print('%6d %5d %7d | %8.3f %5d %9d | %8.3f %5d %9d' % (
+            rows, cols, blank_rows, old_time, old_requests, old_cells,
+            new_time, new_requests, new_cells))
+    print('both ways find the same rows')
+
+
+if __name__ == '__main__':
+    main()
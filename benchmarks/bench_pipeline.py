@@ -0,0 +1,592 @@
+# -*- coding: utf-8 -*-
+""" Benchmark of the import pipeline on synthetic sheets
+
+Run ``GoogleSpreadsheetDocument.run()``, then ``import_document()`` (with
+``convert_import_data()``) for each job it queued, on in-process fake
+sheets counting their requests: tall, wide, one2many, with errors, with
+a blank tail. The module code runs as is: only the ORM is replaced by
+in-memory stand-ins (records, the field list of ``base_import``, the
+name search of the countries, the job queue) and ``load()`` by a method
+rejecting the rows of the country 'Atlantis'.
+
+- ``plan (s)``: ``run()``, the sheet opened, its end of data located, its
+  rows scanned, the chunks planned and their jobs queued
+- ``jobs (s)``: the jobs, one after another (fetch pool, field matching,
+  conversion, ``load()``, errors write-back by the writer thread,
+  flushed before the end of the measure)
+- ``reqs``: requests sent to the sheet, its openings (worksheets feed)
+  included; ``opens``: openings by the jobs
+- ``conv (s)``: conversion time (``time_convert``) recorded by the jobs
+- ``alloc (MiB)``: memory allocated by the pipeline, as the peak resident
+  memory of the process above the one before ``run()`` (each scenario
+  runs in a fresh process; Python 2 has no allocation tracer)
+
+``--latency`` simulates the duration of a request::
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --latency 0.05 --chunk-size 200
+"""
+
+import argparse
+import imp
+import importlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+ADDON = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     os.pardir, 'connector_google_spreadsheet')
+
+WIDE_FIELDS = ['name', 'ref', 'email', 'phone', 'mobile', 'fax', 'street',
+               'street2', 'zip', 'city', 'website', 'function', 'comment']
+
+
+def tall(rnd):
+    """ Many rows of a few columns """
+    header = ['name', 'ref', 'email', 'city', 'zip']
+    rows = [['Partner %s' % index, 'T%s' % index,
+             'p%s@example.com' % index, 'City %s' % rnd.randint(0, 500),
+             '%05d' % rnd.randint(0, 99999)] for index in range(20000)]
+    return header, rows, 0
+
+
+def wide(rnd):
+    """ Many columns, most of them matching no field """
+    header = WIDE_FIELDS + ['extra_%s' % index for index in range(45)]
+    rows = [['Partner %s' % index] +
+            ['v%s' % rnd.randint(0, 99) for __ in header[1:]]
+            for index in range(2000)]
+    return header, rows, 0
+
+
+def one2many(rnd):
+    """ Companies followed by the rows of their contacts """
+    header = ['name', 'is_company', 'child_ids/name', 'child_ids/email']
+    rows = []
+    for index in range(2000):
+        for contact in range(6):
+            rows.append(['Company %s' % index if not contact else '',
+                         '1' if not contact else '',
+                         'Contact %s-%s' % (index, contact),
+                         'c%s-%s@example.com' % (index, contact)])
+    return header, rows, 0
+
+
+def errors(rnd):
+    """ A fifth of the rows in error, written in the ERRORS column """
+    header = ['ERRORS', 'name', 'email', 'country_id']
+    rows = [['', 'Partner %s' % index, 'p%s@example.com' % index,
+             'Atlantis' if rnd.random() < 0.2 else 'France']
+            for index in range(5000)]
+    return header, rows, 0
+
+
+def blank_tail(rnd):
+    """ A few rows followed by many blank rows """
+    header = ['name', 'ref', 'email']
+    rows = [['Partner %s' % index, 'B%s' % index, 'p%s@example.com' % index]
+            for index in range(2000)]
+    return header, rows, 100000
+
+
+SCENARIOS = [('tall', tall), ('wide', wide), ('one2many', one2many),
+             ('errors', errors), ('blank_tail', blank_tail)]
+
+
+# Fake sheet
+
+class Cell(object):
+    __slots__ = ('row', 'col', 'value')
+
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeSheet(object):
+    """ Rows followed by ``blank_rows`` blank rows, counting the requests
+        of all the threads
+    """
+
+    title = 'Sheet1'
+    updated = '2026-01-01T00:00:00.000Z'
+
+    def __init__(self, rows, blank_rows, latency):
+        self.rows = rows
+        self.row_count = len(rows) + blank_rows
+        self.col_count = max(len(row) for row in rows)
+        self.latency = latency
+        self.requests = 0
+        self.openings = 0
+        self._lock = threading.Lock()
+
+    def request(self, opening=False):
+        with self._lock:
+            self.requests += 1
+            self.openings += opening
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _value(self, row, col):
+        if row <= len(self.rows) and col <= len(self.rows[row - 1]):
+            return self.rows[row - 1][col - 1]
+        return ''
+
+    def get_addr_int(self, row, col):
+        return '%s,%s' % (row, col)
+
+    def range(self, label):
+        row_start, col_start, row_end, col_end = map(
+            int, label.replace(':', ',').split(','))
+        self.request()
+        return [Cell(row, col, self._value(row, col))
+                for row in range(row_start, row_end + 1)
+                for col in range(col_start, col_end + 1)]
+
+    def has_values(self, row_start, row_end, col_start, col_end):
+        # (the cells feed without return-empty, one cell at most)
+        self.request()
+        last_row = min(row_end, len(self.rows))
+        return any(self._value(row, col)
+                   for row in range(row_start, last_row + 1)
+                   for col in range(col_start, col_end + 1))
+
+    def update_cells(self, cells):
+        self.request()
+        for cell in cells:
+            self.rows[cell.row - 1][cell.col - 1] = cell.value
+
+
+class FakeDocument(object):
+    """ A document of one sheet: its worksheets feed is read again by
+        each opening (as gspread does once the source resets it)
+    """
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def worksheet(self, title):
+        self.sheet.request(opening=True)
+        return self.sheet
+
+    def worksheets(self):
+        self.sheet.request(opening=True)
+        return [self.sheet]
+
+
+# ORM stand-ins
+
+class Field(object):
+    """ A field definition: records get its default value """
+
+    type = None
+
+    def __init__(self, *args, **kwargs):
+        self.default = kwargs.get('default', False)
+        if self.type in ('many2one', 'one2many', 'many2many'):
+            self.comodel_name = args and args[0] or kwargs.get(
+                'comodel_name')
+            if self.type != 'many2one':
+                self.default = Recordset()
+
+
+class Datetime(Field):
+    type = 'datetime'
+
+    @staticmethod
+    def now():
+        return Datetime.to_string(datetime.now())
+
+    @staticmethod
+    def to_string(value):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class Recordset(list):
+    """ An empty recordset """
+
+    @property
+    def ids(self):
+        return [record.id for record in self]
+
+    def pending_jobs(self):
+        return []
+
+
+class Model(object):
+    """ A record holding its values """
+
+    _name = None
+
+    def __init__(self, env, **values):
+        self.env = env
+        self._cr = env.cr
+        for name in dir(type(self)):
+            field = getattr(type(self), name)
+            if isinstance(field, Field):
+                setattr(self, name, field.default)
+        self.__dict__.update(values)
+
+    def ensure_one(self):
+        return self
+
+    def exists(self):
+        return self
+
+    def write(self, values):
+        self.__dict__.update(values)
+        return True
+
+
+class Table(object):
+    """ The records of a model """
+
+    def __init__(self, env, name, record_class=Model):
+        self.env = env
+        self._name = name
+        self.record_class = record_class
+        self.records = {}
+
+    def create(self, values):
+        record = self.record_class(self.env, id=len(self.records) + 1,
+                                   **values)
+        self.records[record.id] = record
+        return record
+
+    def browse(self, record_id=None):
+        if record_id is None:
+            return Recordset()
+        return self.records[record_id]
+
+    def search(self, domain, limit=None):
+        return Recordset()
+
+
+class RunTable(Table):
+
+    def create(self, values):
+        values = dict(values, prerequisite_run_ids=Recordset())
+        return super(RunTable, self).create(values)
+
+
+class RunChunkTable(Table):
+
+    def create(self, values):
+        run = self.env['google.spreadsheet.run'].browse(values['run_id'])
+        return super(RunChunkTable, self).create(dict(values, run_id=run))
+
+    def record_result(self, chunk_id, vals, row_errors=None,
+                      own_transaction=False):
+        self.browse(chunk_id).write(vals)
+
+
+class ConfigParameters(Table):
+
+    def get_param(self, key, default=False):
+        return default
+
+
+class Countries(Table):
+
+    def name_search(self, name='', operator='ilike'):
+        return [(1, name)] if name == 'France' else []
+
+
+class ImportWizard(Table):
+    """ base_import.import: fields of res.partner only """
+
+    def get_fields(self, cr, uid, model, context=None, depth=None):
+        return [{'name': name} for name in self.env['res.partner']._fields]
+
+    def _match_headers(self, rows, fields, options):
+        headers = next(rows)
+        partner_fields = self.env['res.partner']._fields
+        return headers, dict(
+            (index, header.split('/')
+             if header.split('/')[0] in partner_fields else [])
+            for index, header in enumerate(headers))
+
+
+class Partners(Table):
+    """ res.partner: ``load()`` rejects the rows of 'Atlantis' (as an
+        unknown country) and rolls back the others
+    """
+
+    def __init__(self, env, name):
+        super(Partners, self).__init__(env, name)
+        self.pool = env.registry
+        self._fields = dict((name, Field()) for name in WIDE_FIELDS +
+                            ['is_company'])
+        self._fields['country_id'] = Field()
+        self._fields['country_id'].type = 'many2one'
+        self._fields['country_id'].comodel_name = 'res.country'
+        self._fields['child_ids'] = Field()
+        self._fields['child_ids'].type = 'one2many'
+        self._fields['child_ids'].comodel_name = 'res.partner'
+
+    def load(self, cr, uid, fields, data, context=None):
+        messages = [{'type': 'error', 'rows': {'from': index, 'to': index},
+                     'message': "No matching record found for name "
+                                "'Atlantis' in field 'Country'"}
+                    for index, row in enumerate(data) if 'Atlantis' in row]
+        ids = [] if messages else range(1, len(data) + 1)
+        return {'ids': ids, 'messages': messages}
+
+
+class Cursor(object):
+
+    dbname = 'bench'
+
+    def __init__(self, env):
+        self.env = env
+
+    def execute(self, query, params=None):
+        pass
+
+    def commit(self):
+        pass
+
+
+class Registry(object):
+
+    base_registry_signaling_sequence = 1
+
+    def __init__(self, env):
+        self.env = env
+
+    def __getitem__(self, name):
+        return self.env[name]
+
+
+class Environment(object):
+
+    def __init__(self, tables):
+        self.cr = Cursor(self)
+        self.uid = 1
+        self.context = {}
+        self.registry = Registry(self)
+        self.tables = dict((name, table_class(self, name))
+                           for name, table_class in tables.items())
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def ref(self, xml_id):
+        return Model(self, id=1)
+
+
+class ConnectorSession(object):
+
+    def __init__(self, cr, uid, context=None):
+        self.cr = cr
+        self.uid = uid
+        self.context = context or {}
+        self.env = cr.env
+        self.pool = cr.env.registry
+
+
+class FailedJobError(Exception):
+    pass
+
+
+class RetryableJobError(Exception):
+
+    def __init__(self, message, seconds=None, ignore_retry=False):
+        super(RetryableJobError, self).__init__(message)
+        self.seconds = seconds
+
+
+# jobs queued by delay(): (function, model name, args)
+QUEUE = []
+
+
+def job(func):
+    def delay(session, model_name, *args, **kwargs):
+        QUEUE.append((func, model_name, args))
+        return 'job-%s' % len(QUEUE)
+    func.delay = delay
+    return func
+
+
+def stub_module(name, **attributes):
+    module = imp.new_module(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    parent, __, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def identity(method):
+    return method
+
+
+def decorator(*args, **kwargs):
+    return identity
+
+
+def load_addon():
+    """ Import the module without Odoo: return ``google_spreadsheet`` """
+    field_types = dict(
+        (name, type(name, (Field,), {'type': name.lower()}))
+        for name in ('Boolean', 'Char', 'Text', 'Integer', 'Float',
+                     'Selection', 'Binary', 'Many2one', 'One2many',
+                     'Many2many'))
+    stub_module('openerp', registry=None, _=lambda source: source,
+                SUPERUSER_ID=1)
+    stub_module('openerp.models', Model=Model, PGERROR_TO_OE={})
+    stub_module('openerp.fields', Datetime=Datetime, **field_types)
+    stub_module('openerp.api', multi=identity, model=identity,
+                one=identity, depends=decorator, constrains=decorator,
+                onchange=decorator)
+    stub_module('openerp.exceptions', Warning=Warning)
+    stub_module('openerp.tools', config={})
+    stub_module('openerp.tools.lru', LRU=lambda count: {})
+    stub_module('openerp.addons')
+    stub_module('openerp.addons.connector')
+    stub_module('openerp.addons.connector.session',
+                ConnectorSession=ConnectorSession)
+    stub_module('openerp.addons.connector.queue')
+    stub_module('openerp.addons.connector.queue.job', job=job,
+                related_action=decorator)
+    stub_module('openerp.addons.connector.exception',
+                FailedJobError=FailedJobError,
+                RetryableJobError=RetryableJobError)
+    try:
+        import psycopg2  # noqa
+    except ImportError:
+        stub_module('psycopg2', Error=Exception, Warning=Warning)
+    # the package without its __init__ (which loads all the models)
+    package = stub_module('connector_google_spreadsheet')
+    package.__path__ = [ADDON]
+    return importlib.import_module(
+        'connector_google_spreadsheet.google_spreadsheet')
+
+
+def resident_memory():
+    """ Current resident memory of the process (KiB) """
+    with open('/proc/self/statm') as statm:
+        pages = int(statm.read().split()[1])
+    return pages * resource.getpagesize() // 1024
+
+
+def run_scenario(options):
+    """ Run one scenario in this process: return its measures """
+    google_spreadsheet = load_addon()
+    source = sys.modules['connector_google_spreadsheet.source']
+
+    class BenchSource(source.SpreadsheetSource):
+        """ bench:// URLs: the fake document of the scenario """
+
+        def open(self, backend, document_url):
+            return document
+
+        def has_values(self, sheet, row_start, row_end, col_start,
+                       col_end):
+            return sheet.has_values(row_start, row_end, col_start, col_end)
+
+    env = Environment({
+        'google.spreadsheet.backend':
+            lambda env, name: Table(
+                env, name, google_spreadsheet.GoogleSpreadsheetBackend),
+        'google.spreadsheet.document':
+            lambda env, name: Table(
+                env, name, google_spreadsheet.GoogleSpreadsheetDocument),
+        'google.spreadsheet.run': RunTable,
+        'google.spreadsheet.run.chunk': RunChunkTable,
+        'ir.config_parameter': ConfigParameters,
+        'base_import.import': ImportWizard,
+        'res.partner': Partners,
+        'res.country': Countries,
+    })
+    header, rows, blank_rows = dict(SCENARIOS)[options.scenario](
+        random.Random(42))
+    sheet = FakeSheet([header] + rows, blank_rows, options.latency)
+    document = FakeDocument(sheet)
+    source.SOURCES['bench'] = BenchSource()
+    backend = env['google.spreadsheet.backend'].create({'name': 'bench'})
+    task = env['google.spreadsheet.document'].create({
+        'name': options.scenario,
+        'model_id': Model(env, model='res.partner'),
+        'document_url': 'bench://%s' % options.scenario,
+        'document_sheet': sheet.title,
+        'chunk_size': options.chunk_size,
+        'backend_id': backend,
+    })
+    memory_start = resident_memory()
+
+    start = time.time()
+    task.run()
+    plan_time = time.time() - start
+    plan_requests = sheet.requests
+    plan_openings = sheet.openings
+
+    start = time.time()
+    failed = 0
+    for func, model_name, args in QUEUE:
+        session = ConnectorSession(env.cr, env.uid, env.context)
+        try:
+            func(session, model_name, *args)
+        except FailedJobError:
+            failed += 1
+    google_spreadsheet.background._flush_writes()
+    jobs_time = time.time() - start
+    chunks = env['google.spreadsheet.run.chunk'].records.values()
+    return {
+        'rows': len(rows),
+        'cols': len(header),
+        'chunks': len(chunks),
+        'failed': failed,
+        'plan': plan_time,
+        'plan_requests': plan_requests,
+        'jobs': jobs_time,
+        'job_requests': sheet.requests - plan_requests,
+        'job_openings': sheet.openings - plan_openings,
+        'convert': sum(chunk.time_convert for chunk in chunks),
+        'rows_per_second': len(rows) / jobs_time if jobs_time else 0,
+        'alloc': max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss -
+                     memory_start, 0) / 1024.,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scenario', choices=dict(SCENARIOS),
+                        help='run a single scenario in this process')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='simulated seconds per request')
+    options = parser.parse_args()
+    if options.scenario:
+        print(json.dumps(run_scenario(options)))
+        return
+
+    print('%-10s %6s %4s %6s %6s %8s %5s %8s %5s %5s %8s %8s %11s' % (
+        'scenario', 'rows', 'cols', 'chunks', 'failed', 'plan (s)', 'reqs',
+        'jobs (s)', 'reqs', 'opens', 'conv (s)', 'rows/s', 'alloc (MiB)'))
+    for name, __ in SCENARIOS:
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--scenario', name,
+             '--chunk-size', str(options.chunk_size),
+             '--latency', str(options.latency)])
+        measures = json.loads(output.strip().splitlines()[-1])
+        print('%-10s %6d %4d %6d %6d %8.3f %5d %8.3f %5d %5d %8.3f %8.0f '
+              '%11.1f' % (
+                  name, measures['rows'], measures['cols'],
+                  measures['chunks'], measures['failed'], measures['plan'],
+                  measures['plan_requests'], measures['jobs'],
+                  measures['job_requests'], measures['job_openings'],
+                  measures['convert'], measures['rows_per_second'],
+                  measures['alloc']))
+
+
+if __name__ == '__main__':
+    main()
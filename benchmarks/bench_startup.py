@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+""" Startup cost of the Google client stack for an Odoo worker
+
+Each case runs in a fresh interpreter and reports the time of its
+imports and the maximum resident memory of the process:
+
+- ``python``: the interpreter alone
+- ``lazy``: the connection layer of the module, which imports the Google
+  client stack on first use only (what a worker which never opens a
+  spreadsheet loads)
+- ``eager``: the same plus the imports that the module used to do at
+  load time (gspread, oauth2client, httplib2 and their crypto
+  dependencies)
+
+::
+
+    python benchmarks/bench_startup.py
+"""
+
+import os
+import subprocess
+import sys
+
+ADDON = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     os.pardir, 'connector_google_spreadsheet')
+RUNS = 7
+
+PROBE = '''
+import resource
+import time
+start = time.time()
+CODE
+elapsed = time.time() - start
+print('%f %d' % (elapsed,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+'''
+
+LAZY = '''
+import imp
+imp.load_source('connection', %r)
+''' % os.path.join(ADDON, 'connection.py')
+
+EAGER = LAZY + '''
+import httplib2
+import gspread
+from oauth2client.client import SignedJwtAssertionCredentials
+from gspread.httpsession import HTTPSession
+from gspread.exceptions import (HTTPError, NoValidUrlKeyFound,
+                                SpreadsheetNotFound)
+'''
+
+CASES = (
+    ('python', 'pass'),
+    ('lazy', LAZY),
+    ('eager', EAGER),
+)
+
+
+def measure(code):
+    """ Median import time (s) and maximum RSS (KiB) over RUNS runs """
+    results = []
+    for __ in range(RUNS):
+        output = subprocess.check_output(
+            [sys.executable, '-c', PROBE.replace('CODE', code)],
+            stderr=open(os.devnull, 'w'))
+        elapsed, rss = output.split()
+        results.append((float(elapsed), int(rss)))
+    results.sort()
+    elapsed = results[len(results) // 2][0]
+    rss = sorted(rss for __, rss in results)[len(results) // 2]
+    return elapsed, rss
+
+
+def main():
+    print('%-8s %12s %10s' % ('case', 'imports (s)', 'RSS (KiB)'))
+    for name, code in CASES:
+        try:
+            elapsed, rss = measure(code)
+        except subprocess.CalledProcessError:
+            print('%-8s %12s %10s' % (name, 'not installed', ''))
+            continue
+        print('%-8s %12.4f %10d' % (name, elapsed, rss))
+
+
+if __name__ == '__main__':
+    main()
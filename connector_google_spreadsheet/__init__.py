@@ -21,4 +21,9 @@
 ###############################################################################
 
 from . import backend
+from . import connection
 from . import google_spreadsheet
+from . import snapshot
+from . import fingerprint
+from . import run
+from . import export
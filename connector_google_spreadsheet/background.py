@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Thread pools running the requests of the import jobs in the
+background (no Odoo dependency)
+
+The pools of a process are created on first use: the threads of a
+forked parent process do not exist in its children.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+# requests of the import jobs of a process sent at the same time
+FETCH_THREADS = 4
+
+_logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# name: (pid, pool)
+_pools = {}
+
+
+def _get_pool(name, size):
+    pid = os.getpid()
+    with _lock:
+        entry = _pools.get(name)
+        if entry is None or entry[0] != pid:
+            entry = _pools[name] = (pid, ThreadPool(size))
+    return entry[1]
+
+
+def fetch(func, *args):
+    """ Call ``func`` in a thread of the fetch pool and return an
+        ``AsyncResult``: its ``get()`` waits for the result of ``func``,
+        or raises its exception
+    """
+    return _get_pool('fetch', FETCH_THREADS).apply_async(func, args)
+
+
+def write(func, *args):
+    """ Call ``func`` in the writer thread of the process, after the
+        previous writes, without waiting for it: its errors are logged
+    """
+    def run():
+        try:
+            func(*args)
+        except Exception:
+            _logger.exception('Spreadsheet write failed')
+    _get_pool('write', 1).apply_async(run)
+
+
+@atexit.register
+def _flush_writes():
+    """ Finish the pending writes before the process exits (a later
+        write creates a new writer thread)
+    """
+    with _lock:
+        entry = _pools.get('write')
+        if entry and entry[0] == os.getpid():
+            del _pools['write']
+        else:
+            entry = None
+    if entry:
+        entry[1].close()
+        entry[1].join()
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Fast load of flat sheets
+
+``bulk_load`` replaces ``load()`` for the chunks made of plain fields and
+many2one fields given by external or database id: the ids of the chunk
+are resolved in a few queries, each distinct value of a column is
+converted once, and identical updates are done in one ``write``. The
+messages have the format of the ``load()`` ones.
+
+It mostly saves the conversion work of ``load()``, not ORM calls: a
+record is still created by its own ``create()`` (the ORM of Odoo 8 has
+no batch create), and updates are only gathered when several rows have
+the same values.
+
+Unlike ``load()``, the external ids are not written through
+``ir.model.data._update``: the new ones are inserted by one query with
+``noupdate`` false, the ``noupdate`` flag of the existing ones is not
+checked, their update date is not changed, and no external id is created
+for the ``_inherits`` parent records.
+"""
+
+import psycopg2
+
+from openerp import SUPERUSER_ID, _
+from openerp.models import PGERROR_TO_OE
+
+# field types converted from their string value by ir.fields.converter
+BULK_FIELD_TYPES = ('char', 'text', 'html', 'integer', 'float', 'boolean',
+                    'date', 'datetime', 'selection', 'many2one')
+# ids per query
+QUERY_BATCH = 1000
+
+
+def split_xmlid(xmlid):
+    """ Return the module and the name of an external id (no module if it
+        has no dot, as ``load()`` does)
+    """
+    if '.' in xmlid:
+        return tuple(xmlid.split('.', 1))
+    return '', xmlid
+
+
+def bulk_load_supported(model_obj, fields):
+    """ Tell if the field paths of a chunk can be loaded by bulk_load """
+    if len(set(fields)) != len(fields):
+        return False
+    for path in fields:
+        if path in ('id', '.id'):
+            continue
+        parts = path.split('/')
+        field = model_obj._fields.get(parts[0])
+        if field is None or field.type not in BULK_FIELD_TYPES:
+            return False
+        if field.type == 'many2one':
+            if parts[1:] not in (['id'], ['.id']):
+                return False
+        elif len(parts) > 1:
+            return False
+    return True
+
+
+def existing_ids(model_obj, cr, ids):
+    """ Return the set of the ids of existing records """
+    ids = list(set(ids))
+    existing = set()
+    for index in range(0, len(ids), QUERY_BATCH):
+        cr.execute('SELECT id FROM "%s" WHERE id IN %%s' % model_obj._table,
+                   (tuple(ids[index:index + QUERY_BATCH]),))
+        existing.update(row[0] for row in cr.fetchall())
+    return existing
+
+
+def resolve_xmlids(model_obj, cr, xmlids):
+    """ Return the ids of the records of the external ids ({xmlid: id})
+        and the external ids of deleted records
+    """
+    keys = dict((split_xmlid(xmlid), xmlid) for xmlid in set(xmlids))
+    key_list = list(keys)
+    res_ids = {}
+    for index in range(0, len(key_list), QUERY_BATCH):
+        cr.execute(
+            "SELECT module, name, res_id FROM ir_model_data "
+            "WHERE model = %s AND (module, name) IN %s",
+            (model_obj._name, tuple(key_list[index:index + QUERY_BATCH])))
+        for module, name, res_id in cr.fetchall():
+            res_ids[keys[(module, name)]] = res_id
+    existing = existing_ids(model_obj, cr, res_ids.values())
+    stale = [xmlid for xmlid, res_id in res_ids.items()
+             if res_id not in existing]
+    for xmlid in stale:
+        del res_ids[xmlid]
+    return res_ids, stale
+
+
+def _log(messages, info, exception):
+    """ Log a conversion error or warning the way ``load()`` does """
+    message = dict(info,
+                   type='warning' if isinstance(exception, Warning)
+                   else 'error',
+                   message=unicode(exception.args[0]) % info)
+    if len(exception.args) > 1 and exception.args[1]:
+        message.update(exception.args[1])
+    messages.append(message)
+
+
+def _not_found(field_type, value):
+    return ValueError(
+        _(u"No matching record found for %(field_type)s '%(value)s' "
+          u"in field '%%(field)s'") % {'field_type': field_type,
+                                       'value': value})
+
+
+def resolve_db_ids(model_obj, cr, values):
+    """ Return the conversion of database id values: {value: (id, [])} or
+        {value: error} for the invalid ones
+    """
+    db_ids = {}
+    resolved = {}
+    for value in set(values):
+        if not value:
+            continue
+        try:
+            db_ids[value] = int(value)
+        except ValueError:
+            resolved[value] = _not_found(_(u"database id"), value)
+    existing = existing_ids(model_obj, cr, db_ids.values())
+    for value, db_id in db_ids.items():
+        if db_id in existing:
+            resolved[value] = (db_id, [])
+        else:
+            resolved[value] = _not_found(_(u"database id"), value)
+    return resolved
+
+
+class ColumnConverter(object):
+    """ Convert the values of a column, each distinct value once
+
+    :param resolved: values already converted: {value: (converted value,
+                     warnings)} or {value: conversion error}
+    :param convert: converter of the other values
+    """
+
+    def __init__(self, name, resolved, convert=None):
+        self.name = name
+        self.cache = resolved
+        self.convert = convert
+
+    @classmethod
+    def for_path(cls, model_obj, cr, uid, path, values, context):
+        """ Return the converter of the values of a field path """
+        name = path.split('/')[0]
+        if path.endswith('/id'):
+            comodel = model_obj.pool[model_obj._fields[name].comodel_name]
+            res_ids = resolve_xmlids(comodel, cr, values)[0]
+            resolved = {}
+            for value in set(values):
+                if value in res_ids:
+                    resolved[value] = (res_ids[value], [])
+                elif value:
+                    resolved[value] = _not_found(_(u"external id"), value)
+            return cls(name, resolved)
+        if path.endswith('/.id'):
+            comodel = model_obj.pool[model_obj._fields[name].comodel_name]
+            return cls(name, resolve_db_ids(comodel, cr, values))
+        column = model_obj._all_columns[name].column
+        return cls(name, {}, model_obj.pool['ir.fields.converter'].to_field(
+            cr, uid, model_obj, column, str, context=context))
+
+    def __call__(self, value):
+        """ Return the converted value and its warnings, or raise the
+            conversion error
+        """
+        if not value:
+            return False, []
+        result = self.cache.get(value)
+        if result is None:
+            if self.convert is None:
+                raise _not_found(_(u"external id"), value)
+            try:
+                result = self.convert(value)
+            except ValueError as e:
+                result = e
+            self.cache[value] = result
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _apply(model_obj, cr, uid, operation, rows, messages, context):
+    """ Run ``operation(rows)`` in a savepoint; if it fails, run it again
+        row by row to log the error of each failing row as ``load()``
+        does
+
+    Return the ids of the rows: {row index: id}.
+    """
+    cr.execute('SAVEPOINT bulk_load_batch')
+    try:
+        ids = operation(rows)
+        cr.execute('RELEASE SAVEPOINT bulk_load_batch')
+        return ids
+    except Exception:
+        cr.execute('ROLLBACK TO SAVEPOINT bulk_load_batch')
+    ids = {}
+    fields_get = model_obj.fields_get(cr, uid, context=context)
+    for row in rows:
+        info = {'rows': {'from': row[0], 'to': row[0]}, 'record': row[0]}
+        cr.execute('SAVEPOINT bulk_load_row')
+        try:
+            ids.update(operation([row]))
+            cr.execute('RELEASE SAVEPOINT bulk_load_row')
+        except psycopg2.Warning as e:
+            messages.append(dict(info, type='warning', message=str(e)))
+            cr.execute('ROLLBACK TO SAVEPOINT bulk_load_row')
+        except psycopg2.Error as e:
+            messages.append(dict(info, type='error', **PGERROR_TO_OE[
+                e.pgcode](model_obj, fields_get, info, e)))
+            cr.execute('ROLLBACK TO SAVEPOINT bulk_load_row')
+        except Exception as e:
+            message = (_('Unknown error during import:') +
+                       ' %s: %s' % (type(e), unicode(e)))
+            messages.append(dict(info, type='error', message=message,
+                                 moreinfo=_('Resolve other errors first')))
+            cr.execute('ROLLBACK TO SAVEPOINT bulk_load_row')
+    return ids
+
+
+def bulk_load(model_obj, cr, uid, fields, data, context=None):
+    """ Load the rows like ``model_obj.load(cr, uid, fields, data)``: return
+        the ids of the records (False if a row fails) and the messages
+    """
+    id_index = fields.index('id') if 'id' in fields else None
+    db_id_index = fields.index('.id') if '.id' in fields else None
+    xmlids = [row[id_index] for row in data if row[id_index]] \
+        if id_index is not None else []
+    db_ids = [row[db_id_index] for row in data if row[db_id_index]] \
+        if db_id_index is not None else []
+    if len(set(xmlids)) != len(xmlids) or len(set(db_ids)) != len(db_ids):
+        # a record updated by several rows: keep the order of load()
+        return model_obj.load(cr, uid, fields, data, context=context)
+
+    cr.execute('SAVEPOINT bulk_load')
+    messages = []
+    res_ids, stale_xmlids = resolve_xmlids(model_obj, cr, xmlids)
+    db_converter = ColumnConverter(
+        '.id', resolve_db_ids(model_obj, cr, db_ids))
+    converters = [
+        ColumnConverter.for_path(model_obj, cr, uid, path,
+                                 [row[index] for row in data], context)
+        if path not in ('id', '.id') else None
+        for index, path in enumerate(fields)]
+    labels = [model_obj._fields[path.split('/')[0]].string
+              if path not in ('id', '.id') else path for path in fields]
+
+    creates = []
+    writes = {}
+    for row_index, row in enumerate(data):
+        failed = False
+        vals = {}
+        for index, converter in enumerate(converters):
+            if converter is None:
+                continue
+            info = {'rows': {'from': row_index, 'to': row_index},
+                    'record': row_index, 'field': labels[index]}
+            try:
+                value, warnings = converter(row[index])
+            except ValueError as e:
+                _log(messages, info, e)
+                failed = True
+                continue
+            for warning in warnings:
+                _log(messages, info, warning)
+            vals[converter.name] = value
+        res_id = None
+        if db_id_index is not None and row[db_id_index]:
+            info = {'rows': {'from': row_index, 'to': row_index},
+                    'record': row_index, 'field': '.id'}
+            try:
+                res_id = db_converter(row[db_id_index])[0]
+            except ValueError as e:
+                _log(messages, info, e)
+                failed = True
+        elif id_index is not None and row[id_index]:
+            res_id = res_ids.get(row[id_index])
+        if failed:
+            continue
+        if res_id:
+            # rows with the same values are updated by one write
+            writes.setdefault(tuple(sorted(vals.items())), []).append(
+                (row_index, res_id))
+        else:
+            xmlid = row[id_index] if id_index is not None else False
+            creates.append((row_index, vals, xmlid))
+
+    ids = {}
+    for vals, rows in writes.items():
+        vals = dict(vals)
+
+        def write(rows, vals=vals):
+            model_obj.write(cr, uid, [res_id for __, res_id in rows], vals,
+                            context=context)
+            return dict(rows)
+        ids.update(_apply(model_obj, cr, uid, write, rows, messages,
+                          context))
+
+    def create(rows):
+        return dict((row_index, model_obj.create(cr, uid, vals,
+                                                 context=context))
+                    for row_index, vals, __ in rows)
+    created = _apply(model_obj, cr, uid, create, creates, messages, context)
+    ids.update(created)
+
+    if any(message['type'] == 'error' for message in messages):
+        cr.execute('ROLLBACK TO SAVEPOINT bulk_load')
+        return {'ids': False, 'messages': messages}
+
+    new_xmlids = [(split_xmlid(xmlid), created[row_index])
+                  for row_index, __, xmlid in creates if xmlid]
+    if stale_xmlids:
+        cr.execute(
+            "DELETE FROM ir_model_data WHERE model = %s "
+            "AND (module, name) IN %s",
+            (model_obj._name, tuple(split_xmlid(xmlid)
+                                    for xmlid in stale_xmlids)))
+    if new_xmlids:
+        cr.executemany(
+            "INSERT INTO ir_model_data (module, name, model, res_id, "
+            "noupdate, create_uid, write_uid, create_date, write_date, "
+            "date_init, date_update) VALUES (%s, %s, %s, %s, false, %s, %s, "
+            "now() at time zone 'UTC', now() at time zone 'UTC', "
+            "now() at time zone 'UTC', now() at time zone 'UTC')",
+            [(module, name, model_obj._name, res_id, SUPERUSER_ID,
+              SUPERUSER_ID) for (module, name), res_id in new_xmlids])
+        model_obj.pool['ir.model.data'].clear_caches()
+    cr.execute('RELEASE SAVEPOINT bulk_load')
+    return {'ids': [ids[index] for index in sorted(ids)],
+            'messages': messages}
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Chunk planning of a sheet (no Odoo dependency) """
+
+import bisect
+
+
+def plan_chunks(cells, first_row, data_row_start, eof, chunk_size):
+    """ Split the data rows in ``(row_start, row_end)`` ranges to import
+
+    :param cells: values of the first data column, the first one being
+                  the value of ``first_row``
+    :param first_row: sheet row of the first value (row after the header)
+    :param data_row_start: first row to import
+    :param eof: last row to import
+    :param chunk_size: minimal number of rows of a chunk
+
+    A one2many relation is represented by a root entry in the first
+    column followed by blank child entries: a chunk is only cut before
+    a non blank cell, or anywhere after the last root entry.
+    """
+    ranges = []
+    # rows can be cut anywhere after the row preceding the last root
+    last_cut = 0
+    for index in range(len(cells) - 1, 0, -1):
+        if cells[index]:
+            last_cut = index - 1
+            break
+    last_index = len(cells) - 1
+    row_start = first_row
+    for index in range(len(cells)):
+        row_end = first_row + index
+        if row_start < data_row_start:
+            row_start += 1
+            continue
+        if row_end == eof:
+            ranges.append((row_start, row_end))
+            break
+        # If the row start and row end is the same then we import one line
+        # So the minimal size is 1
+        if row_end - row_start + 1 >= chunk_size and (
+                index >= last_cut or
+                index < last_index and cells[index + 1]):
+            ranges.append((row_start, row_end))
+            row_start = row_end + 1
+    return ranges
+
+
+def row_groups(cells, first_row, data_row_start, eof, first_column_rows):
+    """ Split the rows to import in ``(row_start, row_end)`` groups: a
+        group starts with a non blank cell of the first data column and
+        holds the blank rows (one2many children) following it
+
+    :param first_column_rows: number of values of ``cells`` telling if
+                              the first column is blank (see
+                              ``scan_data_rows``): the rows after them
+                              belong to the last group
+    """
+    groups = []
+    for row in range(data_row_start, eof + 1):
+        index = row - first_row
+        if row == data_row_start or (index < first_column_rows and
+                                     cells[index]):
+            groups.append([row, row])
+        else:
+            groups[-1][1] = row
+    return [tuple(group) for group in groups]
+
+
+def plan_group_chunks(groups, chunk_size):
+    """ Gather groups in chunks of at least ``chunk_size`` rows
+
+    Only contiguous groups are gathered, and a group is never split.
+    Return the list of chunks, each one being the list of its groups.
+    """
+    chunks = []
+    chunk = []
+    for group in groups:
+        if chunk and (chunk[-1][1] + 1 != group[0] or
+                      chunk[-1][1] - chunk[0][0] + 1 >= chunk_size):
+            chunks.append(chunk)
+            chunk = []
+        chunk.append(group)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def split_point(starts, start, stop):
+    """ Return the group start the closest to the middle of the rows
+        ``[start, stop)``, None when these rows are a single group
+
+    :param starts: sorted indexes of the rows starting a group
+    """
+    first = bisect.bisect_right(starts, start)
+    last = bisect.bisect_left(starts, stop)
+    if first >= last:
+        return None
+    middle = (start + stop) // 2
+    index = bisect.bisect_left(starts, middle, first, last)
+    candidates = [starts[i] for i in (index - 1, index) if first <= i < last]
+    return min(candidates, key=lambda row: abs(row - middle))
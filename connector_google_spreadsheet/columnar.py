@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Columnar representation of a chunk (no Odoo dependency) """
+
+import itertools
+import operator
+from array import array
+
+
+class ColumnarChunk(object):
+    """ Values of a chunk of rows, stored by imported column
+
+    - ``fields``: field path of each column, the columns of the unknown
+      headers and the ``skip_import`` column being dropped
+    - ``columns``: one list of values per field
+    - ``group_flags``: bytearray telling for each row of the chunk if its
+      first sheet column is filled (start of a one2many group)
+    - ``valid``: bytearray telling for each row of the chunk if it is
+      loaded: not blank and not skipped
+    - ``positions``: offset in the chunk of each loaded row
+
+    The rows given to ``load()`` are only built once, by ``rows()``.
+    """
+
+    def __init__(self, row_count, fields, columns, group_flags):
+        self.row_count = row_count
+        self.fields = list(fields)
+        self.columns = list(columns)
+        self.group_flags = group_flags
+        skip_column = None
+        if 'skip_import' in self.fields:
+            index = self.fields.index('skip_import')
+            self.fields.pop(index)
+            skip_column = self.columns.pop(index)
+        if self.columns:
+            # (the row tuples are built and freed one at a time)
+            valid = map(any, itertools.izip(*self.columns))
+        else:
+            valid = [False] * row_count
+        if skip_column is not None:
+            valid = map(operator.and_, valid,
+                        map(operator.not_, skip_column))
+        self.valid = bytearray(valid)
+        self.positions = array('l', itertools.compress(itertools.count(),
+                                                       self.valid))
+
+    @classmethod
+    def from_rows(cls, rows, fields):
+        """ Build the chunk from rows of values (one value per field) """
+        if not isinstance(rows, list):
+            rows = list(rows)
+        indices = [index for index, field in enumerate(fields) if field]
+        columns = [[row[index] for row in rows] for index in indices]
+        group_flags = bytearray(bool(row and row[0]) for row in rows)
+        return cls(len(rows), [fields[index] for index in indices],
+                   columns, group_flags)
+
+    @classmethod
+    def from_columns(cls, columns, fields):
+        """ Build the chunk from the values of each sheet column (lists
+            of the same length), the columns without field being dropped
+            (they may be None, except the first one, which tells where
+            the one2many groups start)
+
+        :param fields: field path of each column
+        """
+        indices = [index for index, field in enumerate(fields) if field]
+        row_count = len(columns[0]) if columns else 0
+        group_flags = bytearray(map(bool, columns[0])) if columns \
+            else bytearray()
+        return cls(row_count, [fields[index] for index in indices],
+                   [columns[index] for index in indices], group_flags)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def rows(self):
+        """ Return the loaded rows, as tuples of values """
+        return list(itertools.compress(itertools.izip(*self.columns),
+                                       self.valid))
+
+    def group_starts(self):
+        """ Return the indexes (among the loaded rows) of the rows starting
+            a one2many group
+        """
+        return [index for index, position in enumerate(self.positions)
+                if self.group_flags[position]]
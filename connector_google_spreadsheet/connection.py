@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Authorized Google clients
+
+The Google client stack (gspread, oauth2client, httplib2 and their crypto
+dependencies) is only imported when a first client is needed: the
+workers which never open a spreadsheet do not load it.
+"""
+
+import base64
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+SCOPE = ['https://spreadsheets.google.com/feeds',
+         'https://docs.google.com/feeds']
+
+# access tokens are refreshed this long before they expire
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+_logger = logging.getLogger(__name__)
+
+
+def backend_key_hash(backend):
+    """ Identify the credentials of a backend: a change of email or key
+        gives another hash and so other clients
+    """
+    return hashlib.sha1(
+        '%s\n%s' % (backend.email or '', backend.p12_key or '')).hexdigest()
+
+
+class _PoolEntry(object):
+    """ Credentials of a backend, shared by the threads of the process,
+        and the gspread clients (one per thread, because their HTTP
+        connections are not thread-safe) with their opened documents:
+        only the lookup of a spreadsheet by URL (which lists all the
+        spreadsheets of the account) is kept, its tabs are fetched
+        again at each opening
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.lock = threading.Lock()
+        # thread ident: (client, access token of the client, documents)
+        self.clients = {}
+
+
+class GoogleClientPool(object):
+    """ Process-level pool of authorized gspread clients
+
+    Clients are keyed by database, backend id and backend key hash: the JWT
+    signing and the authorization round-trip are only done once per
+    process and backend, then tokens are refreshed shortly before they
+    expire.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _get_entry(self, backend):
+        dbname = backend.env.cr.dbname
+        key = (dbname, backend.id, backend_key_hash(backend))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                from oauth2client.client import SignedJwtAssertionCredentials
+                # email or key changed: forget the previous credentials
+                self._drop(dbname, backend.id)
+                private_key = base64.b64decode(backend.p12_key)
+                credentials = SignedJwtAssertionCredentials(
+                    backend.email, private_key, SCOPE)
+                entry = self._entries[key] = _PoolEntry(credentials)
+        return entry
+
+    def _refresh_token(self, entry):
+        credentials = entry.credentials
+        with entry.lock:
+            expiry = credentials.token_expiry
+            if (not credentials.access_token or expiry is None or
+                    expiry - TOKEN_REFRESH_MARGIN <= datetime.utcnow()):
+                import httplib2
+                _logger.debug('Refresh Google access token')
+                credentials.refresh(httplib2.Http())
+            return credentials.access_token
+
+    def get_client(self, backend):
+        """ Return an authorized client for the backend and the current
+            thread, and the cache of its opened documents
+        """
+        return self.client_factory(backend)()
+
+    def client_factory(self, backend):
+        """ Return a function giving ``get_client(backend)`` for the
+            thread calling it, without using the ORM: it can be called
+            by other threads than the one of the backend environment
+        """
+        entry = self._get_entry(backend)
+        dbname = backend.env.cr.dbname
+        backend_id = backend.id
+        return lambda: self._thread_client(entry, dbname, backend_id)
+
+    def _thread_client(self, entry, dbname, backend_id):
+        token = self._refresh_token(entry)
+        ident = threading.current_thread().ident
+        with entry.lock:
+            cached = entry.clients.get(ident)
+            if cached is None:
+                import gspread
+                from .throttle import ThrottledHTTPSession
+                alive = set(thread.ident for thread in threading.enumerate())
+                for other_ident in entry.clients.keys():
+                    if other_ident not in alive:
+                        del entry.clients[other_ident]
+                client = gspread.Client(
+                    auth=entry.credentials,
+                    http_session=ThrottledHTTPSession(dbname, backend_id))
+                cached = [client, None, {}]
+                entry.clients[ident] = cached
+        client = cached[0]
+        if cached[1] != token:
+            client.session.add_header('Authorization', 'Bearer ' + token)
+            cached[1] = token
+        return client, cached[2]
+
+    def _drop(self, dbname, backend_id):
+        for key in self._entries.keys():
+            if key[:2] == (dbname, backend_id):
+                del self._entries[key]
+
+    def drop(self, dbname, backend_id):
+        with self._lock:
+            self._drop(dbname, backend_id)
+
+
+client_pool = GoogleClientPool()
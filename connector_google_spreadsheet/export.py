@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+from openerp import models, fields, api, _
+from openerp.exceptions import Warning
+from openerp.tools.safe_eval import safe_eval
+from openerp.addons.connector.session import ConnectorSession
+from openerp.addons.connector.queue.job import job, related_action
+
+from .google_spreadsheet import SHEET_APP, open_document, open_document_url
+from .reader import find_data_end, iter_windows
+from .source import get_source
+
+# rows of the sheet read at once to compare them with the records
+EXPORT_WINDOW_ROWS = 2000
+# changed cells sent by one update request
+EXPORT_BATCH_CELLS = 5000
+
+
+def format_value(field, value, names):
+    """ Text of a value returned by ``read()`` in a cell, written as
+        Google Spreadsheets keeps it (its input value) so that unchanged
+        values are not sent again
+
+    :param names: display names of the records of the x2many values
+    """
+    if field.type == 'boolean':
+        return u'TRUE' if value else u'FALSE'
+    if value is False or value is None:
+        return u''
+    if isinstance(value, float) and value.is_integer():
+        return unicode(int(value))
+    if field.type == 'many2one':
+        return value[1]
+    if field.type in ('one2many', 'many2many'):
+        return u','.join(names[record_id] for record_id in value)
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return unicode(value)
+
+
+class GoogleSpreadsheetExport(models.Model):
+    _name = 'google.spreadsheet.export'
+    _description = 'Google Spreadsheet Export'
+    _order = 'sequence ASC'
+
+    name = fields.Char(required=True)
+    sequence = fields.Integer()
+    active = fields.Boolean(default=True)
+    scheduled = fields.Boolean(
+        help="If checked, the export is run by the 'Spreadsheet Export' "
+             "planified task")
+    backend_id = fields.Many2one(
+        'google.spreadsheet.backend',
+        string='Google Spreadsheet Backend')
+    model_id = fields.Many2one(
+        'ir.model',
+        string='Model',
+        required=True,
+        help="ERP Model")
+    model_name = fields.Char(related='model_id.model', readonly=True)
+    export_id = fields.Many2one(
+        'ir.exports',
+        string='Export Profile',
+        required=True,
+        help="Fields written in the columns of the sheet, in this order: "
+             "fields of the model (no path)")
+    domain = fields.Char(
+        default='[]',
+        help="Domain of the exported records")
+    document_url = fields.Char(
+        'URL',
+        required=True,
+        help="URL of the spreadsheet")
+    document_sheet = fields.Char(
+        'Sheet Name',
+        required=True,
+        help="Document tab name")
+    header_row = fields.Integer(
+        'Header',
+        default=1,
+        help="Row of the field names, followed by the records")
+    batch_size = fields.Integer(
+        default=500,
+        help="Records read at once")
+    last_result = fields.Text(readonly=True)
+
+    @api.multi
+    def _export_fields(self):
+        """ Return the exported fields (new API field objects) """
+        self.ensure_one()
+        model = self.env[self.model_id.model]
+        names = self.export_id.export_fields.mapped('name')
+        unknown = [name for name in names if name not in model._fields]
+        if unknown or not names:
+            raise Warning(SHEET_APP,
+                          _("The export profile '%s' must list fields of the "
+                            "model '%s' (no path): %s") % (
+                              self.export_id.name, self.model_id.model,
+                              ', '.join(unknown)))
+        return [model._fields[name] for name in names]
+
+    @api.multi
+    def _build_grid(self):
+        """ Return the rows of the sheet: the field names then the values
+            of the records, read batch by batch
+        """
+        self.ensure_one()
+        export_fields = self._export_fields()
+        names = [field.name for field in export_fields]
+        grid = [names]
+        model = self.env[self.model_id.model]
+        ids = model.search(safe_eval(self.domain or '[]')).ids
+        batch_size = max(self.batch_size, 1)
+        for index in range(0, len(ids), batch_size):
+            records = model.browse(ids[index:index + batch_size])
+            values = records.read(names)
+            # display names of the x2many values: one name_get per
+            # comodel and batch
+            x2many_names = {}
+            for field in export_fields:
+                if field.type not in ('one2many', 'many2many'):
+                    continue
+                comodel_ids = set(record_id for row in values
+                                  for record_id in row[field.name])
+                x2many_names[field.name] = dict(
+                    self.env[field.comodel_name].browse(
+                        list(comodel_ids)).name_get())
+            for row in values:
+                grid.append([
+                    format_value(field, row[field.name],
+                                 x2many_names.get(field.name))
+                    for field in export_fields])
+            # the values read are not needed anymore
+            records.invalidate_cache()
+        return grid
+
+    @api.multi
+    def export_now(self):
+        session = ConnectorSession(
+            self.env.cr,
+            self.env.uid,
+            self.env.context,
+        )
+        for export in self:
+            export_records.delay(
+                session, self._name,
+                {'export_id': export.id,
+                 'document_url': export.document_url},
+                priority=export.sequence,
+                description="Spreadsheet export: %s" % export.name)
+        return True
+
+    @api.model
+    def export_scheduled(self, *args, **kwargs):
+        self.search([('scheduled', '=', True)]).export_now()
+        return True
+
+
+class GoogleSpreadsheetBackend(models.Model):
+    _inherit = 'google.spreadsheet.backend'
+
+    export_ids = fields.One2many(
+        'google.spreadsheet.export',
+        'backend_id',
+        string='Exports')
+
+
+def diff_cells(cells, grid, row_start):
+    """ Return the cells whose value differs from the grid (the rows of
+        the sheet from ``row_start``), their value being updated; cells
+        beyond the grid are cleared
+    """
+    changed = []
+    for cell in cells:
+        index = cell.row - row_start
+        value = u''
+        if index < len(grid) and cell.col <= len(grid[index]):
+            value = grid[index][cell.col - 1]
+        # the value as typed, not as displayed, when the source has it
+        current = getattr(cell, 'input_value', None)
+        if current is None:
+            current = cell.value
+        if (current or u'') != value:
+            cell.value = value
+            changed.append(cell)
+    return changed
+
+
+@job
+@related_action(action=open_document_url)
+def export_records(session, model_name, args):
+    """ Write the records of an export in its sheet, sending only the
+        cells which changed
+    """
+    export = session.env[model_name].browse(args['export_id'])
+    if not export.exists():
+        return _('Export deleted: nothing to write')
+    grid = export._build_grid()
+    header_row = max(export.header_row, 1)
+    sheet = open_document(export.backend_id, export.document_url).worksheet(
+        export.document_sheet)
+    requests = 0
+    row_end = header_row + len(grid) - 1
+    col_end = len(grid[0])
+    if row_end > sheet.row_count or col_end > sheet.col_count:
+        sheet.resize(rows=max(row_end, sheet.row_count),
+                     cols=max(col_end, sheet.col_count))
+        requests += 1
+    # the rows below the records are compared too (old records are
+    # cleared) down to the end of the data: the blank rows after it are
+    # located by a few small requests instead of being read
+    source = get_source(export.document_url)
+    probes = []
+
+    def has_values(start, stop):
+        probes.append(start)
+        return source.has_values(sheet, start, stop, 1, col_end)
+    data_end = find_data_end(header_row, sheet.row_count, has_values,
+                             EXPORT_WINDOW_ROWS)
+    requests += len(probes)
+    changed_count = 0
+    pending = []
+    for __, __, cells in iter_windows(sheet, header_row,
+                                      max(data_end, row_end), 1, col_end,
+                                      EXPORT_WINDOW_ROWS):
+        requests += 1
+        pending.extend(diff_cells(cells, grid, header_row))
+        if len(pending) >= EXPORT_BATCH_CELLS:
+            sheet.update_cells(pending)
+            requests += 1
+            changed_count += len(pending)
+            pending = []
+    if pending:
+        sheet.update_cells(pending)
+        requests += 1
+        changed_count += len(pending)
+    result = (_("%s records exported: %s cells changed, %s requests") %
+              (len(grid) - 1, changed_count, requests))
+    export.last_result = result
+    return result
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+import hashlib
+
+from openerp import models, fields, api
+
+
+def group_digest(seed, rows, col_start, col_end):
+    """ Hash the values of the rows of a group between two columns """
+    digest = hashlib.sha1(seed.encode('utf-8'))
+    width = col_end - col_start + 1
+    for row in rows:
+        values = list(row[col_start - 1:col_end])
+        values.extend([''] * (width - len(values)))
+        digest.update(u'\x1e'.join(values).encode('utf-8'))
+        digest.update('\x1f')
+    return digest.hexdigest()
+
+
+class GoogleSpreadsheetFingerprint(models.Model):
+    """ Digest of the rows of a one2many group (keyed by its root row)
+        as it was when it was last imported successfully
+    """
+    _name = 'google.spreadsheet.fingerprint'
+    _description = 'Google Spreadsheet Row Fingerprint'
+    _order = 'row ASC'
+
+    document_id = fields.Many2one(
+        'google.spreadsheet.document',
+        string='Spreadsheet Document',
+        required=True,
+        index=True,
+        ondelete='cascade')
+    row = fields.Integer(required=True, help="Root row of the group")
+    digest = fields.Char(required=True)
+
+    _sql_constraints = [
+        ('row_uniq', 'unique(document_id, row)',
+         "A row can only have one fingerprint"),
+    ]
+
+    @api.model
+    def load_digests(self, document_id):
+        self.env.cr.execute(
+            "SELECT row, digest FROM google_spreadsheet_fingerprint "
+            "WHERE document_id = %s", (document_id,))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def store_digests(self, document_id, digests):
+        """ Record the digests ({root row: digest}) of imported groups """
+        if not digests:
+            return
+        digests = dict((int(row), digest) for row, digest in digests.items())
+        self.env.cr.execute(
+            "DELETE FROM google_spreadsheet_fingerprint "
+            "WHERE document_id = %s AND row IN %s",
+            (document_id, tuple(digests)))
+        for row, digest in digests.items():
+            self.env.cr.execute(
+                "INSERT INTO google_spreadsheet_fingerprint "
+                "(document_id, row, digest, create_uid, create_date, "
+                " write_uid, write_date) "
+                "VALUES (%s, %s, %s, %s, now() at time zone 'UTC', "
+                "        %s, now() at time zone 'UTC')",
+                (document_id, row, digest, self.env.uid, self.env.uid))
@@ -20,66 +20,197 @@
 #
 ###############################################################################
 
+import functools
+import json
 import logging
-import base64
-import operator
-import itertools
+import time
 import traceback
 
-from httplib2 import ServerNotFoundError
-import gspread
-from gspread.exceptions import NoValidUrlKeyFound, SpreadsheetNotFound
-from oauth2client.client import SignedJwtAssertionCredentials
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from openerp import registry, models, fields, api, _
 from openerp.exceptions import Warning
 from openerp.addons.connector.session import ConnectorSession
 from openerp.addons.connector.queue.job import job, related_action
-from openerp.addons.connector.exception import FailedJobError
+from openerp.addons.connector.exception import (FailedJobError,
+                                                 RetryableJobError)
 from openerp.tools import config
-
-SCOPE = ['https://spreadsheets.google.com/feeds',
-         'https://docs.google.com/feeds']
+from openerp.tools.lru import LRU
+
+from . import background
+from .bulk_load import bulk_load, bulk_load_supported
+from .columnar import ColumnarChunk
+from .chunking import (plan_chunks, plan_group_chunks, row_groups,
+                       split_point)
+from .connection import client_pool
+from .fingerprint import group_digest
+from .source import get_source
+from .references import resolve_references
+from .reader import (find_data_end, iter_rows, read_columns, read_header,
+                     scan_data_rows)
+from .run import timed, write_chunk_values
 
 FIELDS_RECURSION_LIMIT = 2
 SHEET_APP = ("Google Spreadsheet Import Issue\n"
              "--------------------------------------------------")
 INITIAL_IMPORT_DOMAIN = [('auto', '=', True), ('submission_date', '=', False)]
+# seconds between two checks of the end of the import jobs of a run
+RUN_ERRORS_RETRY_DELAY = 60
+# advisory locks limiting the concurrent import jobs of a document
+CHUNK_LOCK_NAMESPACE = 0x4753
+MAX_CHUNK_SLOTS = 1000
+CHUNK_SLOT_RETRY_DELAY = 10
+# a started import job is considered as stopped by a crash after this
+# delay (s) when its run is resumed
+STALLED_JOB_DELAY = 3600
+# delay before an import job checks again its prerequisite runs
+PREREQUISITE_RETRY_DELAY = 30
+# adaptive chunk size: runs used to measure the import time of a row
+ADAPTIVE_HISTORY_RUNS = 5
+MAX_ADAPTIVE_CHUNK_SIZE = 5000
 
 
 _logger = logging.getLogger(__name__)
 
+# (db, model, headers, lang): (registry signature, field paths)
+_import_fields_cache = LRU(64)
+
 
 def open_document(backend, document_url):
-    # Auhentification
-    private_key = base64.b64decode(backend.p12_key)
-    credentials = SignedJwtAssertionCredentials(
-        backend.email, private_key, SCOPE)
+    source = get_source(document_url)
     try:
-        gc = gspread.authorize(credentials)
-    except ServerNotFoundError:
+        document = source.open(backend, document_url)
+    except RetryableJobError:
+        # (request budget exhausted or Google still refusing requests)
+        raise
+    except Exception as e:
         if config.get('debug_mode'): raise
-        raise Warning(SHEET_APP, _("Check your internet connection.\n"
-                                   "Impossible to establish a connection "
-                                   "with Google Services"))
+        raise Warning(SHEET_APP, source.error_message(backend, e))
+    return document
+
+
+def _document_opener(backend, document_url):
+    """ Return the source of a document and a function opening it,
+        callable by other threads
+    """
+    source = get_source(document_url)
     try:
-        document = gc.open_by_url(document_url)
-    except NoValidUrlKeyFound:
-        if config.get('debug_mode'): raise
-        raise Warning(SHEET_APP, _('Google Drive: No valid key found in URL'))
-    except SpreadsheetNotFound:
-        if config.get('debug_mode'): raise
-        raise Warning(SHEET_APP,
-                      _("Spreadsheet Not Found"
-                        "\n\nResolution\n----------------\n"
-                        "Check URL file & sharing options with it "
-                        "with this google user:\n\n%s" % backend.email))
+        return source, source.opener(backend, document_url)
+    except RetryableJobError:
+        raise
     except Exception as e:
         if config.get('debug_mode'): raise
-        raise Warning(SHEET_APP,
-                      _("Google Drive: %s" % e.message))
-    return document
+        raise Warning(SHEET_APP, source.error_message(backend, e))
+
+
+def fetch_sheet(backend, document_url, document_sheet, read, timings):
+    """ Start ``read(sheet)`` in a thread of the fetch pool, the sheet
+        being opened by this thread
+
+    Return a function waiting for the result of ``read``. It adds the
+    time spent by the thread to open the sheet and to read it to
+    ``timings['time_auth']`` and ``timings['time_fetch']``.
+    """
+    source, opener = _document_opener(backend, document_url)
+
+    def fetch():
+        start = time.time()
+        sheet = opener().worksheet(document_sheet)
+        opened = time.time()
+        result = read(sheet)
+        return opened - start, time.time() - opened, result
+    pending = background.fetch(fetch)
+
+    def wait():
+        try:
+            time_auth, time_fetch, result = pending.get()
+        except RetryableJobError:
+            raise
+        except Exception as e:
+            if config.get('debug_mode'): raise
+            raise Warning(SHEET_APP, source.error_message(backend, e))
+        timings['time_auth'] = timings.get('time_auth', 0.0) + time_auth
+        timings['time_fetch'] = timings.get('time_fetch', 0.0) + time_fetch
+        return result
+    return wait
+
+
+def write_errors_later(backend, document_url, document_sheet, row_start,
+                       row_end, error_col, row_errors, changed_cells=None,
+                       run_chunk_id=None):
+    """ Write the errors ({row: message}) of rows in the ERRORS column
+        from the writer thread: the job does not wait for the requests
+
+    A failure of the write is recorded in the ``write_back_error`` of
+    the run chunk ``run_chunk_id``, if given.
+
+    :param changed_cells: cells of the ERRORS column to update (see
+                          ``changed_error_cells``), found by the writer
+                          thread when not given
+    """
+    __, opener = _document_opener(backend, document_url)
+    # (the thread does not use the ORM: the cursor of the job is closed)
+    dbname = backend.env.cr.dbname
+
+    def write():
+        try:
+            sheet = opener().worksheet(document_sheet)
+            if changed_cells is not None:
+                sheet.update_cells(changed_cells)
+                return
+            error_cells = sheet.range(
+                sheet.get_addr_int(row_start, error_col) + ':' +
+                sheet.get_addr_int(row_end, error_col))
+            write_error_cells(sheet, error_cells, row_errors)
+        except Exception as e:
+            if run_chunk_id:
+                write_chunk_values(dbname, run_chunk_id, {
+                    'write_back_error': '%s: %s' % (type(e).__name__, e)})
+            raise
+    background.write(write)
+
+
+def match_import_fields(env, model_name, headers):
+    """ Return the field paths ('partner_id/id') matching the header
+        cells, False for the unknown ones
+
+    The field tree of base_import is walked once per model, header and
+    language, until the registry is reloaded.
+    """
+    registry = env.registry
+    signature = (id(registry), registry.base_registry_signaling_sequence)
+    key = (env.cr.dbname, model_name, tuple(headers), env.context.get('lang'))
+    cached = _import_fields_cache.get(key)
+    if cached and cached[0] == signature:
+        return list(cached[1])
+
+    import_obj = registry['base_import.import']
+    available_fields = import_obj.get_fields(
+        env.cr,
+        env.uid,
+        model_name,
+        context=env.context,
+        depth=FIELDS_RECURSION_LIMIT
+    )
+    available_fields.append({
+        u'name': u'skip_import',
+        u'string': u'Skip Import',
+        })
+
+    headers_rawders, headers_match = import_obj._match_headers(
+        iter([headers]),
+        available_fields,
+        options={'headers': True},
+    )
+
+    fields = [False] * len(headers_match)
+    for indice, header in headers_match.items():
+        if isinstance(header, list) and len(header):
+            fields[indice] = '/'.join(header)
+        else:
+            fields[indice] = False
+    _import_fields_cache[key] = (signature, fields)
+    return list(fields)
 
 
 class GoogleSpreadsheetDocument(models.Model):
@@ -118,6 +249,64 @@ class GoogleSpreadsheetDocument(models.Model):
         default=0,
         help="Last row of data: 0 means last row")
     chunk_size = fields.Integer('Chunk size', default=100)
+    adaptive_chunk_size = fields.Boolean(
+        help="If checked, the chunk size is computed from the import time "
+             "per row measured by the previous runs to reach the target "
+             "job duration, and reduced when jobs fail")
+    target_job_duration = fields.Integer(
+        'Target Job Duration (s)', default=60)
+    seconds_per_row = fields.Float(
+        'Measured Seconds per Row', readonly=True, digits=(16, 6),
+        help="Average import time of a row over the last runs")
+    bisect_errors = fields.Boolean(
+        'Isolate Failing Rows',
+        help="If checked, a chunk whose import fails is split (between "
+             "one2many groups) and imported again part by part until the "
+             "failing rows are isolated: the other rows are imported")
+    bulk_load = fields.Boolean(
+        'Fast Load',
+        help="If checked, the sheets of plain fields (and many2one fields "
+             "given by external or database id) are loaded with bulk "
+             "queries instead of the row by row standard import. The "
+             "other sheets use the standard import.")
+    max_concurrent_chunks = fields.Integer(
+        'Concurrent Chunks',
+        default=0,
+        help="Maximum number of import jobs of this document running at "
+             "the same time: 0 means no limit")
+    poll = fields.Boolean(
+        'Poll Changes',
+        help="If checked, the task is run by the polling cron, only when "
+             "the sheet has changed since its last run: the revision of "
+             "the sheet is checked without reading any cell")
+    last_revision = fields.Char(
+        readonly=True,
+        help="Revision (last update time) of the sheet at its last run")
+    depends_on_ids = fields.Many2many(
+        'google.spreadsheet.document',
+        'google_spreadsheet_document_depends_rel',
+        'document_id', 'depends_on_id',
+        string='Depends On',
+        help="The import jobs of this document start once the import jobs "
+             "of these documents are finished (done or failed): the "
+             "documents which do not depend on each other are imported "
+             "at the same time")
+    snapshot = fields.Boolean(
+        'Snapshot Mode',
+        help="If checked, the whole sheet is fetched once per run and "
+             "stored: import jobs read their rows from this snapshot "
+             "instead of downloading them from Google")
+    incremental = fields.Boolean(
+        help="If checked, only the rows changed since their last "
+             "successful import are imported (implies the snapshot mode)")
+    error_write_back = fields.Selection(
+        selection=[('chunk', 'By Chunk'), ('run', 'Once per Run')],
+        string='Errors Write-Back',
+        default='chunk',
+        required=True,
+        help="By Chunk: each import job writes its errors in the ERRORS "
+             "column.\nOnce per Run: import jobs record their errors and "
+             "a last job writes the whole ERRORS column at once.")
     active = fields.Boolean(default=True)
     sequence = fields.Integer()
     backend_id = fields.Many2one(
@@ -125,6 +314,29 @@ class GoogleSpreadsheetDocument(models.Model):
         string='Google Spreadsheet Backend'
     )
 
+    @api.constrains('depends_on_ids')
+    def _check_depends_on(self):
+        if not self._check_m2m_recursion('depends_on_ids'):
+            raise Warning(SHEET_APP, _('The dependencies between the '
+                                       'documents must not be circular'))
+
+    @api.multi
+    def _dependency_order(self):
+        """ Return the documents sorted by sequence, a document coming
+            after the documents it depends on
+        """
+        remaining = list(self.sorted(key=lambda document: document.sequence))
+        ordered = []
+        while remaining:
+            remaining_ids = set(document.id for document in remaining)
+            ready = next(
+                (document for document in remaining
+                 if not remaining_ids & set(document.depends_on_ids.ids)),
+                remaining[0])
+            ordered.append(ready)
+            remaining.remove(ready)
+        return self.browse([document.id for document in ordered])
+
     @api.multi
     def toggle_chunk_size(self):
         for record in self:
@@ -136,12 +348,18 @@ class GoogleSpreadsheetDocument(models.Model):
 
     @api.model
     def startup_import(self, *args, **kwargs):
-        tasks = self.search(INITIAL_IMPORT_DOMAIN, order='sequence')
-        if tasks:
+        tasks = self.search(INITIAL_IMPORT_DOMAIN)._dependency_order()
+        batch_tasks = tasks.filtered(lambda task: task.backend_id.batch_run)
+        if batch_tasks:
+            batch_tasks.run_batch()
+        # (the tasks of the other backends are not delayed by batch tasks
+        # failing again and again)
+        other_tasks = tasks - batch_tasks
+        if other_tasks:
             # run only one task at a once because execution time
             # is unpredictable: it depends of Google
-            tasks[0].run()
-        else:
+            other_tasks[0].run()
+        if not tasks:
             # when all tasks have been run, the cron can be inactivated
             cron = self.env.ref(
                 'connector_google_spreadsheet.ir_cron_spreadsheet_import')
@@ -158,8 +376,17 @@ class GoogleSpreadsheetDocument(models.Model):
                                     description=description)
             return True
 
+    @api.model
+    def poll_changes(self, *args, **kwargs):
+        """ Run the polled tasks whose sheet has changed """
+        self.search([('poll', '=', True)]).run_batch(skip_unchanged=True)
+        return True
+
     def _prepare_import_args(
-            self, fields, row_start, row_end, col_start, col_end, error_col):
+            self, fields, row_start, row_end, col_start, col_end, error_col,
+            snapshot_id=False, fingerprints=None, run_chunk_id=False,
+            errors_by_run=False, bisect=False, bulk_load=False, run_id=False,
+            dry_run=False):
         return {
             'document_url': self.document_url,
             'document_sheet': self.document_sheet,
@@ -171,10 +398,214 @@ class GoogleSpreadsheetDocument(models.Model):
             'error_col': error_col,
             'erp_model': self.model_id.model,
             'backend_id': self.backend_id.id,
+            'snapshot_id': snapshot_id,
+            'document_id': self.id,
+            'fingerprints': fingerprints,
+            'run_chunk_id': run_chunk_id,
+            'run_id': run_id,
+            'dry_run': dry_run,
+            'errors_by_run': errors_by_run,
+            'bisect': bisect,
+            'bulk_load': bulk_load,
+            'field_paths': match_import_fields(
+                self.env, self.model_id.model, fields),
         }
 
+    @api.multi
+    def reset_fingerprints(self):
+        """ Forget the imported rows: the next run imports all of them """
+        self.env['google.spreadsheet.fingerprint'].search(
+            [('document_id', 'in', self.ids)]).unlink()
+        return True
+
+    def _get_chunk_size(self):
+        """ Chunk size of a new run """
+        if not self.adaptive_chunk_size:
+            return self.chunk_size
+        runs = self.env['google.spreadsheet.run'].search(
+            [('document_id', '=', self.id), ('dry_run', '=', False)],
+            limit=ADAPTIVE_HISTORY_RUNS)
+        if not runs:
+            return self.chunk_size
+        self.env.cr.execute(
+            "SELECT sum(duration), sum(rows_in) "
+            "FROM google_spreadsheet_run_chunk "
+            "WHERE run_id IN %s AND date_end IS NOT NULL",
+            (tuple(runs.ids),))
+        duration, rows_in = self.env.cr.fetchone()
+        chunk_size = runs[0].chunk_size or self.chunk_size
+        if rows_in:
+            self.seconds_per_row = duration / rows_in
+            if self.seconds_per_row:
+                chunk_size = int(self.target_job_duration /
+                                 self.seconds_per_row)
+            else:
+                chunk_size = MAX_ADAPTIVE_CHUNK_SIZE
+        # jobs of the last run stopped before recording their result
+        # (timeout, killed worker, crash): halve its chunk size
+        # (the jobs failed because of rows in error record it, the
+        # postponed ones are pending)
+        stopped_chunks = runs[0].chunk_ids.filtered(
+            lambda chunk: chunk.job_uuid and not chunk.date_end)
+        stalled_date = fields.Datetime.to_string(
+            datetime.now() - timedelta(seconds=STALLED_JOB_DELAY))
+        stopped_jobs = stopped_chunks and \
+            self.env['queue.job'].search_count([
+                ('uuid', 'in', stopped_chunks.mapped('job_uuid')),
+                '|', ('state', '=', 'failed'),
+                '&', ('state', '=', 'started'),
+                ('date_started', '<', stalled_date),
+            ])
+        if stopped_jobs and runs[0].chunk_size:
+            chunk_size = min(chunk_size, runs[0].chunk_size // 2)
+        return min(max(chunk_size, 1), MAX_ADAPTIVE_CHUNK_SIZE)
+
+    def _plan_changed_chunks(self, rows, cells, first_column_rows,
+                             first_row, data_row_start, eof, col_start,
+                             col_end, import_fields, chunk_size):
+        """ Plan chunks for the one2many groups whose rows changed since
+            they were last imported, with the digests of their groups
+        """
+        fingerprint_obj = self.env['google.spreadsheet.fingerprint']
+        stored = fingerprint_obj.load_digests(self.id)
+        # a change of model or header invalidates all the rows
+        seed = u'\n'.join([self.model_id.model] + import_fields)
+        changed = []
+        for row_start, row_end in row_groups(
+                cells, first_row, data_row_start, eof, first_column_rows):
+            digest = group_digest(
+                seed, rows[row_start - 1:row_end], col_start, col_end)
+            if stored.get(row_start) != digest:
+                changed.append((row_start, row_end, digest))
+        chunks = []
+        for groups in plan_group_chunks(changed, chunk_size):
+            digests = dict((group[0], group[2]) for group in groups)
+            chunks.append((groups[0][0], groups[-1][1], digests))
+        return chunks
+
+    def _get_snapshot(self, sheet):
+        """ Return the snapshot of the sheet revision and its rows,
+            fetching all the cells in one request if it is not stored yet
+
+        The sheet must come from a document just opened: its revision is
+        the one of the worksheets feed read by this opening.
+        """
+        snapshot_obj = self.env['google.spreadsheet.snapshot']
+        revision = sheet.updated
+        snapshot = snapshot_obj.find(self, self.document_sheet, revision)
+        if snapshot:
+            return snapshot, snapshot.read_rows(1, snapshot.row_count)
+        rows = sheet.get_all_values()
+        snapshot = snapshot_obj.store(self, self.document_sheet, revision, rows)
+        return snapshot, rows
+
+    def _skip_reason(self, sheet):
+        """ Return why the polled sheet must not be imported, None if it
+            must be
+        """
+        last_run = self.env['google.spreadsheet.run'].search(
+            [('document_id', '=', self.id), ('dry_run', '=', False)],
+            limit=1)
+        if last_run.pending_jobs():
+            return _('The jobs of the last run are not finished')
+        # (whatever the result of the last run: rows failing until the
+        # sheet is fixed must not import the whole sheet at each poll)
+        if sheet.updated and sheet.updated == self.last_revision:
+            return _('The sheet has not changed since the last run')
+        return None
+
     @api.multi
     def run(self):
+        self.ensure_one()
+        document = open_document(self.backend_id, self.document_url)
+        sheet = document.worksheet(self.document_sheet)
+        task_result = self._run_sheet(sheet)
+        self.backend_id.write({'task_result': task_result})
+
+        view_id = self.env.ref('connector_google_spreadsheet.'
+                               'view_google_spreadsheet_backend_form')
+        return {
+            'res_model': 'google.spreadsheet.backend',
+            'view_id': view_id.id,
+            'type': 'ir.actions.act_window',
+            'view_mode': 'form',
+            'res_id': self.backend_id.id,
+            'target': 'current',
+        }
+
+    @api.multi
+    def validate(self):
+        """ Check the whole sheet without importing it: the import jobs
+            load their rows and roll them back, then a last job writes all
+            the errors in the ERRORS column
+        """
+        self.ensure_one()
+        document = open_document(self.backend_id, self.document_url)
+        sheet = document.worksheet(self.document_sheet)
+        task_result = self._run_sheet(sheet, dry_run=True)
+        self.backend_id.write({'task_result': task_result})
+        return True
+
+    @api.multi
+    def run_batch(self, skip_unchanged=False):
+        """ Run the tasks in one pass: each spreadsheet is opened once and
+            the list of its tabs (with their revision) fetched once for all
+            its tasks
+
+        The tasks are planned after the tasks they depend on: the jobs of
+        independent tasks run at the same time, the jobs of a dependent
+        task wait for the jobs of its prerequisites.
+        """
+        task_results = []
+        tasks = self._dependency_order()
+        # document url: (document, sheets by title) or the opening error
+        documents = {}
+        for task in tasks:
+            if task.document_url not in documents:
+                try:
+                    document = open_document(task.backend_id,
+                                             task.document_url)
+                    sheets = dict((sheet.title, sheet)
+                                  for sheet in document.worksheets())
+                    documents[task.document_url] = (document, sheets)
+                except Exception as e:
+                    _logger.exception('Spreadsheet %s can not be opened',
+                                      task.document_url)
+                    documents[task.document_url] = e
+            opened = documents[task.document_url]
+            try:
+                if isinstance(opened, Exception):
+                    raise opened
+                document, sheets = opened
+                with self.env.cr.savepoint():
+                    # a single-sheet source (CSV file) may not name
+                    # its sheet as the task does
+                    sheet = (sheets.get(task.document_sheet) or
+                             document.worksheet(task.document_sheet))
+                    task_results.append(task._run_sheet(
+                        sheet, skip_unchanged=skip_unchanged))
+            except Exception as e:
+                _logger.exception('Task %s failed', task.name)
+                task_results.append(_("Task '%s'\n%s") % (task.name, e))
+        for backend in tasks.mapped('backend_id'):
+            backend.task_result = '\n\n'.join(task_results)
+        return True
+
+    def _run_sheet(self, sheet, skip_unchanged=False, dry_run=False):
+        """ Plan the import of the sheet and create its jobs, return
+            the task result
+
+        :param skip_unchanged: do nothing if the sheet revision is the one
+                               of the last run, or if the jobs of the last
+                               run are not finished
+        :param dry_run: validate all the rows of the sheet, fetched once,
+                        without importing them
+        """
+        if skip_unchanged:
+            skip_reason = self._skip_reason(sheet)
+            if skip_reason:
+                return _("Task '%s'\n%s") % (self.name, skip_reason)
+        run_start = time.time()
         session = ConnectorSession(
             self.env.cr,
             self.env.uid,
@@ -182,9 +613,6 @@ class GoogleSpreadsheetDocument(models.Model):
         )
         task_result = ''
         count_created_job = 0
-        backend = self.backend_id
-        document = open_document(backend, self.document_url)
-        sheet = document.worksheet(self.document_sheet)
 
         header_row = max(self.header_row, 1)
         data_row_start = max(self.data_row_start, 2)
@@ -198,7 +626,14 @@ class GoogleSpreadsheetDocument(models.Model):
                         'Check the row parameters')
             raise Warning(SHEET_APP, message)
 
-        first_row = [c or '' for c in sheet.row_values(header_row)]
+        snapshot = rows = None
+        if self.snapshot or self.incremental or dry_run:
+            snapshot, rows = self._get_snapshot(sheet)
+            header_values = rows[header_row - 1] if len(rows) >= header_row \
+                else []
+            first_row = _strip_empty_tail(header_values)
+        else:
+            first_row = read_header(sheet, header_row)
         if not first_row:
             raise Warning(SHEET_APP, _('Header cells seems empty!'))
         if first_row[0].lower() in ('error', 'errors'):
@@ -210,109 +645,230 @@ class GoogleSpreadsheetDocument(models.Model):
             import_fields = first_row
             error_col = None
 
-        # first column data cells
-        first_column_data_cells = sheet.col_values(col_start)[header_row:]
-        if not first_column_data_cells:
+        col_end = len(first_row)
+
+        # one pass on the data columns (window by window if they are read
+        # from the sheet) finds the first column cells and the "real" end
+        # of "file" (eof)
+        # (the rows after the last row given by the user are not read)
+        if snapshot:
+            data_rows = (row[col_start - 1:col_end]
+                         for row in rows[header_row:data_row_end or None])
+        else:
+            # the blank rows at the bottom of the sheet are located by a
+            # few small requests instead of being read
+            source = get_source(self.document_url)
+            row_count = sheet.row_count
+            if data_row_end:
+                row_count = min(row_count, data_row_end)
+            data_end = find_data_end(
+                header_row + 1, row_count,
+                lambda start, stop: source.has_values(
+                    sheet, start, stop, col_start, col_end))
+            data_rows = iter_rows(sheet, header_row + 1, data_end,
+                                  col_start, col_end)
+        cells, first_column_rows, last_row = scan_data_rows(data_rows)
+        if not first_column_rows:
             message = _('Nothing to import,'
                         'the first column of data seams empty!')
             raise Warning(SHEET_APP, message)
 
-        col_end = len(first_row)
-
-        eof = header_row + len(first_column_data_cells)
-
         if data_row_end > 0:
-            eof = min(data_row_end, eof)
+            eof = min(data_row_end, header_row + first_column_rows)
+        else:
+            # (the user has not specified the data row end)
+            eof = header_row + last_row
 
         # chunks logic
-
-        row_start = header_row + 1
-        row_end = row_start
-        cells = first_column_data_cells
-
-        # calculate "real" end of "file" (eof)
-        # (if the user has not specified the data row end)
-        if not data_row_end and sheet.row_count > eof:
-            start = sheet.get_addr_int(eof+1, col_start)
-            stop = sheet.get_addr_int(sheet.row_count, col_end)
-            eof_chunk = sheet.range(start + ':' + stop)
-            for cell in eof_chunk:
-                if cell.value and cell.row > eof:
-                    eof = cell.row
-                    # append missing cells (empty)
-                    cells.append(cell.value)
-
-        indexes = [
-            i-1 for i, cell in enumerate(cells) if cell and i
-        ]
-
-        def cut_allowed(index, indexes):
-            return index in indexes or index >= max(indexes or [0])
-
-        # Iterate on first data column
-        for i, cell in enumerate(cells):
-
-            if row_start < data_row_start:
-                row_start += 1
-                row_end = row_start
-                continue
-
-            # If the row start and row end is the same then we import one line
-            # So the minimal size is 1
-            size = row_end - row_start + 1
-            if cut_allowed(i, indexes) \
-                    and size >= self.chunk_size or row_end == eof:
-
-                import_args = self._prepare_import_args(
-                    import_fields,
-                    row_start,
-                    row_end,
-                    col_start,
-                    col_end,
-                    error_col
-                )
-                description = "Spreadsheet import: %s" % self.name
-                import_document.delay(session, self._name,
-                                      import_args, priority=self.sequence,
-                                      description=description)
-                count_created_job += 1
-
-                if row_end == eof:
+        chunk_size = self._get_chunk_size()
+        if self.incremental and not dry_run:
+            chunks = self._plan_changed_chunks(
+                rows, cells, first_column_rows, header_row + 1,
+                data_row_start, eof, col_start, col_end, import_fields,
+                chunk_size)
+        else:
+            chunks = [
+                (row_start, row_end, None) for row_start, row_end
+                in plan_chunks(cells, header_row + 1, data_row_start, eof,
+                               chunk_size)]
+        description = "Spreadsheet import: %s" % self.name
+        run = None
+        if chunks:
+            run_obj = self.env['google.spreadsheet.run']
+            # the last run of each prerequisite: its jobs may still be
+            # running or waiting
+            prerequisite_runs = run_obj.browse()
+            for prerequisite in self.depends_on_ids:
+                if dry_run:
+                    # validate now, against the current records
                     break
-
-                row_end += 1
-                row_start = row_end
-            else:
-                row_end += 1
+                prerequisite_runs += run_obj.search(
+                    [('document_id', '=', prerequisite.id),
+                     ('dry_run', '=', False)], limit=1)
+            run = run_obj.create({
+                'document_id': self.id,
+                'snapshot_id': snapshot and snapshot.id,
+                'error_col': error_col,
+                'row_start': data_row_start,
+                'row_end': eof,
+                'chunk_size': chunk_size,
+                'errors_by_run': (error_col is not None and
+                                  (self.error_write_back == 'run' or
+                                   dry_run)),
+                'dry_run': dry_run,
+                'date_start': run_start,
+                'prerequisite_run_ids': [(6, 0, prerequisite_runs.ids)],
+            })
+        for row_start, row_end, fingerprints in chunks:
+            run_chunk = self.env['google.spreadsheet.run.chunk'].create({
+                'run_id': run.id,
+                'row_start': row_start,
+                'row_end': row_end,
+            })
+            import_args = self._prepare_import_args(
+                import_fields,
+                row_start,
+                row_end,
+                col_start,
+                col_end,
+                error_col,
+                snapshot_id=snapshot and snapshot.id,
+                fingerprints=fingerprints,
+                run_chunk_id=run_chunk.id,
+                # a validation records its errors even without ERRORS
+                # column, and never commits the partial chunks of bisect
+                errors_by_run=run.errors_by_run or dry_run,
+                bisect=self.bisect_errors and not dry_run,
+                dry_run=dry_run,
+                bulk_load=self.bulk_load,
+                run_id=run.id,
+            )
+            job_uuid = import_document.delay(
+                session, self._name, import_args, priority=self.sequence,
+                description=description)
+            run_chunk.write({'job_uuid': job_uuid,
+                             'job_args': json.dumps(import_args)})
+            count_created_job += 1
+        if run and (run.errors_by_run or dry_run):
+            write_run_errors.delay(
+                session, self._name,
+                {'run_id': run.id, 'document_url': self.document_url},
+                priority=self.sequence + 1, max_retries=0,
+                description="Spreadsheet errors write-back: %s" % self.name)
+        if run:
+            run.time_plan = time.time() - run_start
 
         # log result (job creation)
-        self.submission_date = fields.Datetime.now()
+        if dry_run:
+            return (_("Validation of task '%s'\n%s created jobs: the errors "
+                      "are reported when they are finished") %
+                    (self.name, count_created_job))
+        self.write({'submission_date': fields.Datetime.now(),
+                    'last_revision': sheet.updated})
         if count_created_job:
             task_result = (
                 _("Last executed task '%s'\n%s created jobs ") % (
                     self.name, count_created_job))
             task_result += _("(menu Connectors > Queue > Jobs).")
-            vals = {'task_result': task_result}
-            self.backend_id.write(vals)
+        elif self.incremental:
+            task_result = _("Task '%s'\nNo row changed since the last "
+                            "run") % self.name
         else:
             task_result = _("Task '%s'\nNo created job") % self.name
             task_result += (_("\nCheck coherence between chunk size '%s' "
                             "and real end of file '%s'")
-                            % (self.chunk_size, eof))
-            vals = {'task_result': task_result}
-            self.backend_id.write(vals)
+                            % (chunk_size, eof))
+        return task_result
+
+
+class GoogleSpreadsheetRun(models.Model):
+    _inherit = 'google.spreadsheet.run'
 
+    @api.multi
+    def _chunks_to_resume(self):
+        """ Chunks not done whose job will not run anymore: failed,
+            cancelled (set to done by hand), deleted or stalled
+        """
         self.ensure_one()
-        view_id = self.env.ref('connector_google_spreadsheet.'
-                               'view_google_spreadsheet_backend_form')
-        return {
-            'res_model': 'google.spreadsheet.backend',
-            'view_id': view_id.id,
-            'type': 'ir.actions.act_window',
-            'view_mode': 'form',
-            'res_id': self.backend_id.id,
-            'target': 'current',
-        }
+        chunks = self.chunk_ids.filtered(lambda c: c.state != 'done')
+        jobs = self.env['queue.job'].search(
+            [('uuid', 'in', chunks.mapped('job_uuid'))])
+        job_by_uuid = dict((job.uuid, job) for job in jobs)
+        stalled_date = fields.Datetime.to_string(
+            datetime.now() - timedelta(seconds=STALLED_JOB_DELAY))
+        to_resume = self.env['google.spreadsheet.run.chunk'].browse()
+        for chunk in chunks:
+            job = job_by_uuid.get(chunk.job_uuid)
+            if job and (job.state in ('pending', 'enqueued') or
+                        job.state == 'started' and
+                        job.date_started > stalled_date):
+                continue
+            to_resume += chunk
+        return to_resume
+
+    @api.multi
+    def resume(self):
+        """ Queue again the import of the chunks which are not done """
+        session = ConnectorSession(
+            self.env.cr,
+            self.env.uid,
+            self.env.context,
+        )
+        chunk_obj = self.env['google.spreadsheet.run.chunk']
+        for run in self:
+            document = run.document_id
+            chunks = run._chunks_to_resume().filtered('job_args')
+            job_count = 0
+            for chunk in chunks:
+                import_args = json.loads(chunk.job_args)
+                if import_args.get('fingerprints'):
+                    # (JSON object keys are strings)
+                    import_args['fingerprints'] = dict(
+                        (int(row), digest) for row, digest
+                        in import_args['fingerprints'].items())
+                parts = [(chunk, import_args)]
+                if chunk.retry_ranges:
+                    # the other rows are imported: a new chunk per group
+                    # in error, the chunk being done
+                    chunk.write({'state': 'done', 'errors': False})
+                    parts = []
+                    for row_start, row_end in json.loads(chunk.retry_ranges):
+                        part = chunk_obj.create({
+                            'run_id': run.id,
+                            'row_start': row_start,
+                            'row_end': row_end,
+                        })
+                        fingerprints = dict(
+                            (row, digest) for row, digest
+                            in (import_args.get('fingerprints') or {}).items()
+                            if row_start <= row <= row_end)
+                        parts.append((part, dict(
+                            import_args, chunk_row_start=row_start,
+                            chunk_row_end=row_end, run_chunk_id=part.id,
+                            fingerprints=fingerprints or None)))
+                for part, part_args in parts:
+                    job_uuid = import_document.delay(
+                        session, document._name, part_args,
+                        priority=document.sequence,
+                        description="Spreadsheet import (resumed): %s" %
+                                    document.name)
+                    part.write({'job_uuid': job_uuid,
+                                'job_args': json.dumps(part_args),
+                                'state': 'pending',
+                                'errors': False,
+                                'date_end': False})
+                    job_count += 1
+            if chunks and (run.errors_by_run or run.dry_run):
+                write_run_errors.delay(
+                    session, document._name,
+                    {'run_id': run.id, 'document_url': document.document_url},
+                    priority=document.sequence + 1, max_retries=0,
+                    description="Spreadsheet errors write-back: %s" %
+                                document.name)
+            run.document_id.backend_id.task_result = (
+                _("Run of task '%s' resumed after row %s\n%s created jobs") %
+                (document.name, run.last_committed_row, job_count))
+        return True
 
 
 class GoogleSpreadsheetBackend(models.Model):
@@ -343,12 +899,42 @@ class GoogleSpreadsheetBackend(models.Model):
         'google.spreadsheet.document',
         'backend_id', string='Google spreadsheet documents',
     )
+    batch_run = fields.Boolean(
+        help="If checked, the startup cron runs all the pending tasks "
+             "at once, opening each spreadsheet only once, instead of one "
+             "task per execution")
+    run_ids = fields.One2many(
+        'google.spreadsheet.run',
+        'backend_id', string='Runs', readonly=True,
+    )
+    request_budget = fields.Integer(
+        'Requests per 100 seconds',
+        default=0,
+        help="Maximum number of requests sent to Google by all the workers "
+             "in 100 seconds (see the quotas of your Google project): "
+             "0 means no limit")
+    quota_window_start = fields.Float(readonly=True, copy=False)
+    quota_used = fields.Integer(readonly=True, copy=False)
 
     _sql_constraints = [
         ('name_uniq', 'unique(name)',
          _("Spreadsheet Import Backend 'Name' field must be unique")),
     ]
 
+    @api.multi
+    def write(self, vals):
+        res = super(GoogleSpreadsheetBackend, self).write(vals)
+        if 'email' in vals or 'p12_key' in vals:
+            for record in self:
+                client_pool.drop(self.env.cr.dbname, record.id)
+        return res
+
+    @api.multi
+    def run_all_tasks(self):
+        for backend in self:
+            backend.document_ids.run_batch()
+        return True
+
     @api.multi
     def active_cron_sheet(self):
         self.ensure_one()
@@ -383,6 +969,13 @@ class GoogleSpreadsheetBackend(models.Model):
         return message + connect_string
 
 
+def _strip_empty_tail(values):
+    values = [value or '' for value in values]
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
 def open_document_url(session, job):
     url = job.args[1]['document_url']
     action = {
@@ -393,38 +986,17 @@ def open_document_url(session, job):
     return action
 
 
-def convert_import_data(rows_to_import, fields):
+def convert_import_data(rows_to_import, fields=None):
+    """ Return the rows to load, their field paths and the position in the
+        chunk of each loaded row
 
-    indices = [index for index, field in enumerate(fields) if field]
-
-    if len(indices) == 1:
-        mapper = lambda row: [row[indices[0]]]
-    else:
-        mapper = operator.itemgetter(*indices)
-
-    import_fields = filter(None, fields)
-    filter_row = False
-    if 'skip_import' in import_fields:
-        skip_import = import_fields.index('skip_import')
-        filter_row = True
-
-    data = []
-    original_position = {}
-    row_number = -1
-    for row in itertools.imap(mapper, rows_to_import):
-        row_number += 1
-        if any(row):
-            if filter_row:
-                if row[skip_import]:
-                    continue
-                else:
-                    row = list(row)
-                    row.pop(skip_import)
-            original_position[len(data)] = row_number
-            data.append(row)
-    if filter_row:
-        import_fields.remove('skip_import')
-    return data, import_fields, original_position
+    :param rows_to_import: a ``ColumnarChunk``, or rows of values with the
+                           field path of each column in ``fields``
+    """
+    chunk = rows_to_import
+    if not isinstance(chunk, ColumnarChunk):
+        chunk = ColumnarChunk.from_rows(rows_to_import, fields)
+    return chunk.rows(), chunk.fields, chunk.positions
 
 
 @job
@@ -438,11 +1010,117 @@ def set_cron_inactive(session, model_name, args):
     return True
 
 
+def write_error_cells(sheet, error_cells, row_errors):
+    """ Write the errors ({row: message}) in the ERRORS column cells,
+        sending only the cells whose value changes
+
+    Unchanged errors do not update the sheet, so they do not change its
+    revision (which would trigger a new import of a polled sheet).
+    """
+    changed_cells = changed_error_cells(error_cells, row_errors)
+    if changed_cells:
+        sheet.update_cells(changed_cells)
+    return len(changed_cells)
+
+
+def changed_error_cells(error_cells, row_errors):
+    """ Return the ERRORS column cells whose value is not the error of
+        their row ({row: message}) anymore, with their new value
+    """
+    changed_cells = []
+    for cell in error_cells:
+        value = row_errors.get(cell.row, '')
+        if (cell.value or '') != value:
+            cell.value = value
+            changed_cells.append(cell)
+    return changed_cells
+
+
+def _wait_prerequisites(session, run_chunk_id):
+    """ Postpone the import job while the jobs of the runs of the
+        documents its document depends on are not finished
+    """
+    run_chunk = session.env['google.spreadsheet.run.chunk'].browse(
+        run_chunk_id)
+    if not run_chunk.exists():
+        return
+    pending_jobs = run_chunk.run_id.prerequisite_run_ids.pending_jobs()
+    if pending_jobs:
+        raise RetryableJobError(
+            _('%s import jobs of the documents this document depends on '
+              'are not finished') % len(pending_jobs),
+            seconds=PREREQUISITE_RETRY_DELAY, ignore_retry=True)
+
+
+def _acquire_chunk_slot(session, document_id):
+    """ Limit the import jobs of a document running at the same time
+        with transaction level advisory locks (shared by all the workers)
+    """
+    document = session.env['google.spreadsheet.document'].browse(
+        document_id)
+    max_chunks = document.exists() and document.max_concurrent_chunks
+    if not max_chunks:
+        return
+    for slot in range(min(max_chunks, MAX_CHUNK_SLOTS)):
+        session.cr.execute(
+            "SELECT pg_try_advisory_xact_lock(%s, %s)",
+            (CHUNK_LOCK_NAMESPACE, document_id * MAX_CHUNK_SLOTS + slot))
+        if session.cr.fetchone()[0]:
+            return
+    raise RetryableJobError(
+        _('%s import jobs of this document are already running')
+        % max_chunks, seconds=CHUNK_SLOT_RETRY_DELAY, ignore_retry=True)
+
+
+def _load_bisect(session, load, import_fields, data, starts, start, stop,
+                 messages=None):
+    """ Load the rows ``[start, stop)`` in a savepoint, splitting them
+        between one2many groups (``starts``) until the failing rows are
+        isolated
+
+    Return the imported ids and the messages (rows relative to data).
+
+    :param messages: messages of a failed load of these rows (rolled
+                     back by ``load``): they are split without loading
+                     them again
+    """
+    if messages is None:
+        session.cr.execute('SAVEPOINT google_spreadsheet_bisect')
+        result = load(session.cr,
+                      session.uid,
+                      import_fields,
+                      data[start:stop],
+                      context=session.context)
+        messages = []
+        for message in result['messages']:
+            message = dict(message, rows={
+                'from': message['rows']['from'] + start,
+                'to': message['rows']['to'] + start,
+            })
+            messages.append(message)
+        if not any(m['type'] == 'error' for m in messages):
+            session.cr.execute(
+                'RELEASE SAVEPOINT google_spreadsheet_bisect')
+            return result['ids'] or [], messages
+        session.cr.execute(
+            'ROLLBACK TO SAVEPOINT google_spreadsheet_bisect')
+    middle = split_point(starts, start, stop)
+    if middle is None:
+        # a single failing group
+        return [], messages
+    ids, messages = _load_bisect(
+        session, load, import_fields, data, starts, start, middle)
+    right_ids, right_messages = _load_bisect(
+        session, load, import_fields, data, starts, middle, stop)
+    return ids + right_ids, messages + right_messages
+
+
 @job
 @related_action(action=open_document_url)
 def import_document(session, model_name, args):
 
-    import_obj = session.pool['base_import.import']
+    job_start = time.time()
+    timings = {}
     model_obj = session.pool[args['erp_model']]
 
     backend_id = args['backend_id']
@@ -454,59 +1132,96 @@ def import_document(session, model_name, args):
     col_start = args['sheet_col_start']
     col_end = args['sheet_col_end']
     error_col = args['error_col']
+    snapshot_id = args.get('snapshot_id')
 
     backend = session.env['google.spreadsheet.backend'].browse(
         backend_id)
 
-    document = open_document(backend, document_url)
-    sheet = document.worksheet(document_sheet)
-
-    start = sheet.get_addr_int(row_start, col_start)
-    stop = sheet.get_addr_int(row_end, col_end)
-    chunk = sheet.range(start + ':' + stop)
-
-    cols = col_end - col_start + 1
-    rows = row_end - row_start + 1
-    data = [['' for c in range(cols)] for r in range(rows)]
-
-    for cell in chunk:
-        i = cell.row - row_start
-        j = cell.col - col_start
-        data[i][j] = cell.value
-
-    available_fields = import_obj.get_fields(
-        session.cr,
-        session.uid,
-        model_obj._name,
-        context=session.context,
-        depth=FIELDS_RECURSION_LIMIT
-    )
-    available_fields.append({
-        u'name': u'skip_import',
-        u'string': u'Skip Import',
-        })
-
-    headers_raw = iter([fields])
-    headers_rawders, headers_match = import_obj._match_headers(
-        headers_raw,
-        available_fields,
-        options={'headers': True},
-    )
-
-    fields = [False] * len(headers_match)
-    for indice, header in headers_match.items():
-        if isinstance(header, list) and len(header):
-            fields[indice] = '/'.join(header)
-        else:
-            fields[indice] = False
-    data, import_fields, original_position = convert_import_data(data, fields)
+    if args.get('run_chunk_id'):
+        _wait_prerequisites(session, args['run_chunk_id'])
+    if args.get('document_id'):
+        _acquire_chunk_slot(session, args['document_id'])
+
+    # resolved once by the run (older jobs resolve it themselves)
+    field_paths = args.get('field_paths')
+    write_errors = error_col is not None and not args.get('errors_by_run')
+    if not snapshot_id:
+        # only the columns of a field are kept (and the first one, which
+        # tells where the one2many groups start)
+        wanted = field_paths and [
+            not index or bool(field)
+            for index, field in enumerate(field_paths)]
+
+        def read_chunk(sheet):
+            columns = read_columns(sheet, row_start, row_end, col_start,
+                                   col_end, wanted=wanted)
+            error_cells = None
+            if write_errors:
+                error_cells = sheet.range(
+                    sheet.get_addr_int(row_start, error_col) + ':' +
+                    sheet.get_addr_int(row_end, error_col))
+            return columns, error_cells
+        # the chunk (and its ERRORS column) are read by a thread of the
+        # fetch pool during the field matching, from a single opening of
+        # the sheet (it records its time_auth and time_fetch)
+        fetched = fetch_sheet(backend, document_url, document_sheet,
+                              read_chunk, timings)
+
+    headers_raw = fields
+    with timed(timings, 'time_match'):
+        fields = field_paths
+        if fields is None:
+            fields = match_import_fields(
+                session.env, model_obj._name, headers_raw)
+
+    # the chunk is stored by column: rows are only built for load()
+    snapshot = None
+    if snapshot_id:
+        # read the chunk from the snapshot stored by the run: no request
+        snapshot = session.env['google.spreadsheet.snapshot'].browse(
+            snapshot_id)
+        if not snapshot.exists():
+            raise FailedJobError(
+                _("The snapshot of sheet '%s' does not exist anymore, "
+                  "run the task again") % document_sheet)
+        with timed(timings, 'time_fetch'):
+            chunk = ColumnarChunk.from_rows(
+                snapshot.read_rows(row_start, row_end, col_start, col_end),
+                fields)
+    else:
+        columns, error_cells = fetched()
+        with timed(timings, 'time_fetch'):
+            chunk = ColumnarChunk.from_columns(columns, fields)
+
+    dry_run = args.get('dry_run')
+    if dry_run:
+        session.cr.execute('SAVEPOINT google_spreadsheet_dry_run')
+    with timed(timings, 'time_convert'):
+        # hand the many2one references to load() as database ids
+        resolve_references(session.env, model_obj, chunk,
+                           args.get('run_id'))
+        data, import_fields, original_position = convert_import_data(chunk)
+    load = model_obj.load
+    if args.get('bulk_load') and bulk_load_supported(model_obj,
+                                                     import_fields):
+        load = functools.partial(bulk_load, model_obj)
     try:
         # import the chunk of clean data
-        result = model_obj.load(session.cr,
-                                session.uid,
-                                import_fields,
-                                data,
-                                context=session.context)
+        with timed(timings, 'time_load'):
+            result = load(session.cr,
+                          session.uid,
+                          import_fields,
+                          data,
+                          context=session.context)
+            if args.get('bisect') and any(m['type'] == 'error'
+                                          for m in result['messages']):
+                # one2many groups start with a value in the first column
+                # (load() rolled back the whole chunk: only its parts are
+                # loaded again)
+                ids, messages = _load_bisect(
+                    session, load, import_fields, data, chunk.group_starts(),
+                    0, len(data), messages=result['messages'])
+                result = {'ids': ids, 'messages': messages}
     except Exception as e:
         if config.get('debug_mode'): raise
         first_row = {}
@@ -525,18 +1240,14 @@ def import_document(session, model_name, args):
                 unimported_fields, imported_fields, data,
                 first_row, e.message, traceb))
 
-    # clear previous errors
-    error_cells = None
-    if error_col is not None:
-        start = sheet.get_addr_int(row_start, error_col)
-        stop = sheet.get_addr_int(row_end, error_col)
-        error_cells = sheet.range(start + ':' + stop)
-        for cell in error_cells:
-            cell.value = ''
+    if dry_run:
+        session.cr.execute('ROLLBACK TO SAVEPOINT google_spreadsheet_dry_run')
+        session.env.invalidate_all()
 
     # log errors
     errors = False
     messages = []
+    row_errors = {}
     for m in result['messages']:
         row_from = row_start + original_position[m['rows']['from']]
         row_to = row_start + original_position[m['rows']['to']]
@@ -547,19 +1258,133 @@ def import_document(session, model_name, args):
             messages.append('%s:line %i: %s' % (message_type, row, message))
             if message_type == 'error':
                 errors = True
-                if error_cells:
-                    for cell in error_cells:
-                        if cell.row == row:
-                            cell.value = backend.format_spreadsheet_error(message)
-                            break
-
-    if error_cells:
-        sheet.update_cells(error_cells)
-
+                row_errors[row] = backend.format_spreadsheet_error(message)
+
+    if write_errors:
+        # (else the errors of the whole run are written by
+        # write_run_errors)
+        write_back_start = time.time()
+        if not snapshot_id:
+            # only the changed cells are sent, by the writer thread
+            changed_cells = changed_error_cells(error_cells, row_errors)
+            if changed_cells:
+                write_errors_later(backend, document_url, document_sheet,
+                                   row_start, row_end, error_col,
+                                   row_errors, changed_cells=changed_cells,
+                                   run_chunk_id=args.get('run_chunk_id'))
+        else:
+            # the sheet is only opened when there are errors to write or
+            # to clear
+            previous_errors = [
+                row[0] for row in snapshot.read_rows(
+                    row_start, row_end, error_col, error_col) if row[0]]
+            if previous_errors or row_errors:
+                write_errors_later(backend, document_url, document_sheet,
+                                   row_start, row_end, error_col,
+                                   row_errors,
+                                   run_chunk_id=args.get('run_chunk_id'))
+        timings['time_write_back'] = time.time() - write_back_start
+
+    if args.get('run_chunk_id'):
+        if errors and args.get('bisect') and result['ids']:
+            # the valid rows are committed below: a resume only imports
+            # the groups in error again
+            roots = sorted(set(
+                [row_start] + [row_start + original_position[index]
+                               for index in chunk.group_starts()]))
+            timings['retry_ranges'] = json.dumps([
+                (root, next_root - 1) for root, next_root
+                in zip(roots, roots[1:] + [row_end + 1])
+                if any(root <= row < next_root for row in row_errors)])
+        rows_in = row_end - row_start + 1
+        job_end = time.time()
+        timings.update({
+            'state': 'failed' if errors and not dry_run else 'done',
+            'date_start': job_start,
+            'date_end': job_end,
+            'duration': job_end - job_start,
+            'rows_in': rows_in,
+            'rows_skipped': rows_in - len(data),
+            'rows_written': len(result['ids'] or []),
+        })
+        # the chunk is only done once the transaction of the job (with its
+        # rows) is committed; the job failed because of rows in error
+        # rollbacks it, except the partial imports of bisect
+        rolled_back = (errors and not dry_run and
+                       not (args.get('bisect') and result['ids']))
+        session.env['google.spreadsheet.run.chunk'].record_result(
+            args['run_chunk_id'], timings,
+            row_errors=row_errors if args.get('errors_by_run') else None,
+            own_transaction=rolled_back)
+
+    if dry_run:
+        return _('Validation: %s rows checked, %s errors') % (
+            len(data), len(row_errors))
+    if errors and args.get('bisect') and result['ids']:
+        if args.get('fingerprints'):
+            # remember the groups imported without error
+            roots = sorted(args['fingerprints'])
+            digests = {}
+            for root, next_root in zip(roots, roots[1:] + [row_end + 1]):
+                if not any(root <= row < next_root for row in row_errors):
+                    digests[root] = args['fingerprints'][root]
+            session.env['google.spreadsheet.fingerprint'].store_digests(
+                args['document_id'], digests)
+        # keep the rows imported around the failing ones
+        session.cr.commit()
+        imported_ids = ', '.join([str(id_) for id_ in result['ids']])
+        messages.append('Imported/Updated ids: %s' % imported_ids)
     if errors:
         raise FailedJobError(messages)
     else:
+        if args.get('fingerprints'):
+            # remember the imported rows for the next incremental run
+            session.env['google.spreadsheet.fingerprint'].store_digests(
+                args['document_id'], args['fingerprints'])
         imported_ids = ', '.join([str(id_) for id_ in result['ids']])
         messages.append('Imported/Updated ids: %s' % imported_ids)
 
     return '\n'.join(messages)
+
+
+@job
+@related_action(action=open_document_url)
+def write_run_errors(session, model_name, args):
+    """ Write the errors of all the chunks of a run in the ERRORS column
+        once they are all finished
+    """
+    run = session.env['google.spreadsheet.run'].browse(args['run_id'])
+    if not run.exists():
+        return _('Run deleted: nothing to write')
+    pending_jobs = run.pending_jobs()
+    if pending_jobs:
+        raise RetryableJobError(
+            _('%s import jobs are not finished') % len(pending_jobs),
+            seconds=RUN_ERRORS_RETRY_DELAY, ignore_retry=True)
+
+    row_errors = run.collect_errors()
+    document = run.document_id
+    if run.error_col:
+        sheet = open_document(
+            document.backend_id, args['document_url']).worksheet(
+            document.document_sheet)
+        start = sheet.get_addr_int(run.row_start, run.error_col)
+        stop = sheet.get_addr_int(run.row_end, run.error_col)
+        error_cells = sheet.range(start + ':' + stop)
+        changed = write_error_cells(sheet, error_cells, row_errors)
+        if changed and not run.dry_run and sheet.updated and \
+                sheet.updated == document.last_revision:
+            # the sheet was not changed since the run: its new revision
+            # comes from these errors, which must not trigger a new run
+            # of a polled task
+            document.last_revision = open_document(
+                document.backend_id, args['document_url']).worksheet(
+                document.document_sheet).updated
+    if run.dry_run:
+        task_result = (
+            _("Validation of task '%s'\n%s rows checked, %s errors, "
+              "%.1f s") % (document.name, run.rows_in, len(row_errors),
+                           run.time_total))
+        document.backend_id.task_result = task_result
+        return task_result
+    return _('%s errors written') % len(row_errors)
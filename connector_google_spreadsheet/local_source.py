@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Spreadsheet source reading and writing local files (no Odoo nor Google
+dependency), to test and benchmark the import offline
+
+The documents are opened from URLs like
+``file:///data/products.xlsx?latency=0.2&quota=500&rows=5000``:
+
+- ``latency``: seconds slept by each request
+- ``quota``: requests allowed per 100 seconds to the file by the process
+  (whatever the number of openings), the following ones raise a '429'
+  error like Google
+- ``rows``: minimal row count of the sheets (Google sheets usually have
+  blank rows after the data)
+
+CSV files are supported natively, XLSX files require ``openpyxl`` and
+ODS files ``pyexcel-ods``.
+"""
+
+import csv
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urlparse import urlparse, parse_qs
+
+QUOTA_WINDOW = 100
+_cell_label_re = re.compile(r'([A-Za-z]+)(\d+)')
+
+_quota_lock = threading.Lock()
+# path: times of the requests of the last quota window
+_quota_windows = {}
+
+
+class LocalSourceError(Exception):
+    pass
+
+
+class LocalQuotaError(LocalSourceError):
+    """ Simulated quota error (same message format as gspread HTTPError,
+        retried as it by ``throttle.retry_request``)
+    """
+
+
+def get_addr_int(row, col):
+    """ Label ('B3') of a cell (1-based) """
+    letters = ''
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return '%s%s' % (letters, row)
+
+
+def get_int_addr(label):
+    """ (row, col) of a cell label """
+    match = _cell_label_re.match(label)
+    if not match:
+        raise LocalSourceError('Incorrect cell label: %s' % label)
+    col = 0
+    for letter in match.group(1).upper():
+        col = col * 26 + ord(letter) - 64
+    return int(match.group(2)), col
+
+
+def _to_text(value):
+    if value is None:
+        return u''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return unicode(value)
+
+
+class LocalCell(object):
+
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+    def __repr__(self):
+        return '<LocalCell R%sC%s %r>' % (self.row, self.col, self.value)
+
+
+class LocalWorksheet(object):
+
+    def __init__(self, document, title, grid):
+        self.document = document
+        self.title = title
+        self.grid = grid
+
+    @property
+    def row_count(self):
+        return max(len(self.grid), self.document.min_rows)
+
+    @property
+    def col_count(self):
+        return max([len(row) for row in self.grid] or [0])
+
+    @property
+    def updated(self):
+        return self.document.updated
+
+    def get_addr_int(self, row, col):
+        return get_addr_int(row, col)
+
+    def _value(self, row, col):
+        if row <= len(self.grid) and col <= len(self.grid[row - 1]):
+            return self.grid[row - 1][col - 1]
+        return u''
+
+    def range(self, alphanum):
+        self.document.request()
+        start, stop = alphanum.split(':')
+        row_start, col_start = get_int_addr(start)
+        row_end, col_end = get_int_addr(stop)
+        return [LocalCell(row, col, self._value(row, col))
+                for row in range(row_start, row_end + 1)
+                for col in range(col_start, col_end + 1)]
+
+    def resize(self, rows=None, cols=None):
+        # the file grows with the cells written in it
+        self.document.request()
+
+    def get_all_values(self):
+        self.document.request()
+        width = self.col_count
+        return [list(row) + [u''] * (width - len(row)) for row in self.grid]
+
+    def update_cells(self, cell_list):
+        self.document.request()
+        for cell in cell_list:
+            while len(self.grid) < cell.row:
+                self.grid.append([])
+            row = self.grid[cell.row - 1]
+            row.extend([u''] * (cell.col - len(row)))
+            row[cell.col - 1] = _to_text(cell.value)
+        self.document.save(self.title, cell_list)
+
+
+class LocalDocument(object):
+    """ Local file with the interface of a gspread spreadsheet """
+
+    def __init__(self, document_url, retry=None):
+        """
+        :param retry: function sending the requests with ``send()`` as
+                      argument, e.g. retrying them (``throttle.retry_request``)
+        """
+        url = urlparse(document_url)
+        self.path = url.path
+        options = dict((key, values[-1])
+                       for key, values in parse_qs(url.query).items())
+        self.latency = float(options.get('latency', 0))
+        self.quota = int(options.get('quota', 0))
+        self.min_rows = int(options.get('rows', 0))
+        self.extension = os.path.splitext(self.path)[1].lower()
+        if self.extension not in ('.csv', '.xlsx', '.ods'):
+            raise LocalSourceError(
+                'Unsupported file type: %s' % self.extension)
+        if not os.path.isfile(self.path):
+            raise LocalSourceError('File not found: %s' % self.path)
+        self.retry = retry
+        self.requests = 0
+        self.request()
+        self.sheets = getattr(self, '_load_%s' % self.extension[1:])()
+
+    @property
+    def updated(self):
+        return datetime.utcfromtimestamp(
+            os.path.getmtime(self.path)).isoformat() + 'Z'
+
+    def request(self):
+        """ Account for a request sent to the spreadsheet service """
+        if self.retry:
+            self.retry(self._send)
+        else:
+            self._send()
+
+    def _send(self):
+        if self.quota:
+            now = time.time()
+            with _quota_lock:
+                window = _quota_windows[self.path] = [
+                    t for t in _quota_windows.get(self.path, [])
+                    if now - t < QUOTA_WINDOW]
+                if len(window) >= self.quota:
+                    raise LocalQuotaError(
+                        '429: Simulated quota of %s requests per %s seconds '
+                        'exceeded' % (self.quota, QUOTA_WINDOW))
+                window.append(now)
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def worksheet(self, title):
+        self.request()
+        if self.extension == '.csv':
+            # a CSV file has a single sheet, whatever its name
+            return LocalWorksheet(self, title, self.sheets.values()[0])
+        if title not in self.sheets:
+            raise LocalSourceError('Worksheet not found: %s' % title)
+        return LocalWorksheet(self, title, self.sheets[title])
+
+    def worksheets(self):
+        self.request()
+        return [LocalWorksheet(self, title, grid)
+                for title, grid in self.sheets.items()]
+
+    def _load_csv(self):
+        with open(self.path, 'rb') as csv_file:
+            grid = [[value.decode('utf-8') for value in row]
+                    for row in csv.reader(csv_file)]
+        return OrderedDict([(os.path.basename(self.path), grid)])
+
+    def _load_xlsx(self):
+        import openpyxl
+        workbook = openpyxl.load_workbook(self.path, data_only=True)
+        return OrderedDict(
+            (sheet.title, [[_to_text(value) for value in row]
+                           for row in sheet.iter_rows(values_only=True)])
+            for sheet in workbook.worksheets)
+
+    def _load_ods(self):
+        from pyexcel_ods import get_data
+        return OrderedDict(
+            (title, [[_to_text(value) for value in row] for row in rows])
+            for title, rows in get_data(self.path).items())
+
+    def save(self, title, cells):
+        """ Save the file after the update of cells of a sheet """
+        getattr(self, '_save_%s' % self.extension[1:])(title, cells)
+
+    def _save_csv(self, title, cells):
+        with open(self.path, 'wb') as csv_file:
+            writer = csv.writer(csv_file)
+            for row in self.sheets.values()[0]:
+                writer.writerow([value.encode('utf-8') for value in row])
+
+    def _save_xlsx(self, title, cells):
+        import openpyxl
+        # (the other cells, formulas included, are kept as they are)
+        workbook = openpyxl.load_workbook(self.path)
+        sheet = workbook[title]
+        for cell in cells:
+            sheet.cell(row=cell.row, column=cell.col).value = \
+                _to_text(cell.value)
+        workbook.save(self.path)
+
+    def _save_ods(self, title, cells):
+        from pyexcel_ods import save_data
+        save_data(self.path, OrderedDict(self.sheets.items()))
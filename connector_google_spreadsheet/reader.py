@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Windowed reading of a sheet (no Odoo dependency)
+
+Only ``WINDOW_ROWS`` rows of cells are held in memory at once, whatever
+the size of the sheet.
+"""
+
+WINDOW_ROWS = 500
+
+
+def iter_windows(sheet, row_start, row_end, col_start, col_end,
+                 window=WINDOW_ROWS):
+    """ Yield ``(start, stop, cells)`` for each window of rows between two
+        columns (1-based, included)
+    """
+    for start in range(row_start, row_end + 1, window):
+        stop = min(start + window - 1, row_end)
+        yield start, stop, sheet.range(
+            sheet.get_addr_int(start, col_start) + ':' +
+            sheet.get_addr_int(stop, col_end))
+
+
+def iter_cells(sheet, row_start, row_end, col_start, col_end,
+               window=WINDOW_ROWS):
+    """ Yield the cells between rows and columns, fetching them window by
+        window
+    """
+    for __, __, cells in iter_windows(sheet, row_start, row_end,
+                                      col_start, col_end, window):
+        for cell in cells:
+            yield cell
+
+
+def _is_full_grid(cells, start, stop, col_start, col_end):
+    """ Tell if the cells of a window are all the cells of its rows, in
+        row order then column order (as the cells feed returns them)
+    """
+    width = col_end - col_start + 1
+    if len(cells) != (stop - start + 1) * width:
+        return False
+    for offset, row in enumerate(range(start, stop + 1)):
+        first = cells[offset * width]
+        last = cells[offset * width + width - 1]
+        if (first.row != row or first.col != col_start or
+                last.row != row or last.col != col_end):
+            return False
+    return True
+
+
+def read_columns(sheet, row_start, row_end, col_start, col_end,
+                 window=WINDOW_ROWS, wanted=None):
+    """ Return the values of the columns between rows (1-based,
+        included), as one list of strings per column, fetching them
+        window by window
+
+    :param wanted: tells for each column if it is needed: the values of
+                   the other ones are not kept, their list is None
+    """
+    width = col_end - col_start + 1
+    if wanted is None:
+        wanted = [True] * width
+    columns = [[] if needed else None for needed in wanted]
+    for start, stop, cells in iter_windows(sheet, row_start, row_end,
+                                           col_start, col_end, window):
+        if _is_full_grid(cells, start, stop, col_start, col_end):
+            # each column is a slice of the values
+            values = [cell.value or '' for cell in cells]
+            for offset, column in enumerate(columns):
+                if column is not None:
+                    column.extend(values[offset::width])
+            continue
+        window_rows = stop - start + 1
+        window_columns = [[''] * window_rows if column is not None
+                          else None for column in columns]
+        for cell in cells:
+            column = window_columns[cell.col - col_start]
+            if column is not None:
+                column[cell.row - start] = cell.value or ''
+        for column, values in zip(columns, window_columns):
+            if column is not None:
+                column.extend(values)
+    return columns
+
+
+def iter_rows(sheet, row_start, row_end, col_start, col_end,
+              window=WINDOW_ROWS):
+    """ Yield the values of the rows between two columns (1-based,
+        included) as lists padded with empty strings, fetching them
+        window by window
+    """
+    width = col_end - col_start + 1
+    for start, stop, cells in iter_windows(sheet, row_start, row_end,
+                                           col_start, col_end, window):
+        rows = [[''] * width for __ in range(stop - start + 1)]
+        for cell in cells:
+            rows[cell.row - start][cell.col - col_start] = cell.value or ''
+        for row in rows:
+            yield row
+
+
+def find_data_end(row_start, row_end, has_values, window=WINDOW_ROWS):
+    """ Return a row between ``row_start`` and ``row_end`` after which
+        all the rows are blank, less than ``window`` rows after the last
+        row with a value (``row_start - 1`` if all the rows are blank)
+
+    :param has_values: function telling if rows ``(start, stop)`` have a
+                       value, called about ``2 * log2(blank rows / window)``
+                       times
+
+    The blank tail is first found by blocks growing from ``window`` rows
+    from the bottom, then by bisection in the last block down to less
+    than a window, read anyway with the data.
+    """
+    # rows from blank_from are blank
+    blank_from = row_end + 1
+    size = window
+    while True:
+        start = max(blank_from - size, row_start)
+        if has_values(start, blank_from - 1):
+            break
+        blank_from = start
+        if start == row_start:
+            return row_start - 1
+        size *= 2
+    # the last row with a value is in [low, high]
+    low, high = start, blank_from - 1
+    while high - low >= window:
+        middle = (low + high + 1) // 2
+        if has_values(middle, high):
+            low = middle
+        else:
+            high = middle - 1
+    return high
+
+
+def read_header(sheet, header_row):
+    """ Values of the header row, without the empty trailing cells """
+    values = next(iter_rows(sheet, header_row, header_row, 1,
+                            sheet.col_count))
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
+def scan_data_rows(rows):
+    """ Find the rows to import from the data rows (values between the
+        first and the last data column, starting after the header)
+
+    Return ``(cells, first_column_rows, last_row)``:
+
+    - ``cells``: a bytearray telling for each row if it may start a
+      chunk: its first column is not blank, or it is after the last
+      value of the first column and has a value in another column
+    - ``first_column_rows``: number of rows up to the last value of the
+      first column
+    - ``last_row``: number of rows up to the last row with a value
+    """
+    first_flags = bytearray()
+    any_flags = bytearray()
+    first_column_rows = last_row = 0
+    for index, row in enumerate(rows, 1):
+        first = bool(row and row[0])
+        filled = first or any(row)
+        first_flags.append(first)
+        any_flags.append(filled)
+        if first:
+            first_column_rows = index
+        if filled:
+            last_row = index
+    cells = first_flags[:first_column_rows]
+    cells.extend(any_flags[first_column_rows:last_row])
+    return cells, first_column_rows, last_row
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Resolution of the many2one references of a chunk in bulk """
+
+from openerp.tools.lru import LRU
+
+from .bulk_load import resolve_xmlids
+
+# references resolved by the recent runs, shared by their jobs running in
+# this process: (dbname, run id, lang): {(comodel, kind): {value: id}}
+_reference_cache = LRU(16)
+
+
+def reference_target(model_obj, path):
+    """ Return the comodel, the kind ('name' or 'xmlid') and the path of
+        the many2one field of a reference given by name or external id
+        ('partner_id', 'order_line/product_id/id'), None for other paths
+    """
+    parts = path.split('/')
+    kind = 'name'
+    if parts[-1] == 'id':
+        kind = 'xmlid'
+        parts = parts[:-1]
+    if not parts or '.id' in parts or 'id' in parts:
+        return None
+    model = model_obj
+    for name in parts[:-1]:
+        # only the lines of a one2many hold other references
+        field = model._fields.get(name)
+        if field is None or field.type != 'one2many':
+            return None
+        model = model.pool[field.comodel_name]
+    field = model._fields.get(parts[-1])
+    if field is None or field.type != 'many2one':
+        return None
+    return model.pool[field.comodel_name], kind, '/'.join(parts)
+
+
+def resolve_references(env, model_obj, chunk, run_id=None):
+    """ Replace the many2one references given by name or external id by
+        database ids in the columns of a chunk (``ColumnarChunk``),
+        resolving each distinct value once
+
+    A column is only rewritten ('partner_id' becomes 'partner_id/.id')
+    when each of its values matches exactly one record: otherwise
+    ``load()`` resolves it and reports the errors and warnings as usual.
+    The references found are kept for the next chunks of the run.
+    """
+    cache = {}
+    if run_id:
+        key = (env.cr.dbname, run_id, env.context.get('lang'))
+        cache = _reference_cache.get(key)
+        if cache is None:
+            cache = _reference_cache[key] = {}
+    for index, path in enumerate(chunk.fields):
+        target = reference_target(model_obj, path)
+        if not target:
+            continue
+        comodel, kind, field_path = target
+        column = chunk.columns[index]
+        values = set(column[position] for position in chunk.positions
+                     if column[position])
+        if not values:
+            continue
+        resolved = cache.setdefault((comodel._name, kind), {})
+        missing = values.difference(resolved)
+        if kind == 'xmlid':
+            resolved.update(resolve_xmlids(comodel, env.cr, missing)[0])
+        else:
+            related = env[comodel._name]
+            for value in missing:
+                matches = related.name_search(name=value, operator='=')
+                if len(matches) == 1:
+                    resolved[value] = matches[0][0]
+        if not values.issubset(resolved):
+            continue
+        chunk.fields[index] = field_path + '/.id'
+        for position in chunk.positions:
+            if column[position]:
+                column[position] = str(resolved[column[position]])
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+import json
+import math
+import time
+from contextlib import contextmanager
+
+from openerp import registry, models, fields, api
+
+# timings recorded by the import jobs (seconds)
+CHUNK_TIMINGS = [
+    'time_auth',
+    'time_fetch',
+    'time_match',
+    'time_convert',
+    'time_load',
+    'time_write_back',
+]
+
+
+@contextmanager
+def timed(timings, key):
+    """ Add the time spent in the block to ``timings[key]`` """
+    start = time.time()
+    try:
+        yield
+    finally:
+        timings[key] = timings.get(key, 0.0) + time.time() - start
+
+
+def write_chunk_values(dbname, chunk_id, vals):
+    """ Write the values of a run chunk in a transaction of its own, from
+        any thread
+    """
+    columns = sorted(vals)
+    cr = registry(dbname).cursor()
+    try:
+        cr.execute(
+            "UPDATE google_spreadsheet_run_chunk SET %s WHERE id = %%s"
+            % ', '.join('%s = %%s' % column for column in columns),
+            [vals[column] for column in columns] + [chunk_id])
+        cr.commit()
+    finally:
+        cr.close()
+
+
+def percentile(values, percent):
+    """ Nearest-rank percentile of a list of values """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+class GoogleSpreadsheetRun(models.Model):
+    _name = 'google.spreadsheet.run'
+    _description = 'Google Spreadsheet Run'
+    _order = 'id DESC'
+
+    document_id = fields.Many2one(
+        'google.spreadsheet.document',
+        string='Spreadsheet Document',
+        required=True,
+        index=True,
+        ondelete='cascade')
+    backend_id = fields.Many2one(
+        related='document_id.backend_id', store=True, readonly=True)
+    date = fields.Datetime(default=fields.Datetime.now)
+    chunk_size = fields.Integer('Chunk Size')
+    time_plan = fields.Float(
+        'Planning (s)', help="Duration of the run: reading of the sheet "
+                             "and creation of the import jobs")
+    error_col = fields.Integer('ERRORS Column')
+    row_start = fields.Integer('First Row')
+    row_end = fields.Integer('Last Row')
+    chunk_ids = fields.One2many(
+        'google.spreadsheet.run.chunk',
+        'run_id', string='Chunks')
+    errors_by_run = fields.Boolean(
+        help="The errors are written by a last job of the run")
+    dry_run = fields.Boolean(
+        'Validation',
+        help="The rows were loaded and rolled back to report their errors")
+    date_start = fields.Float(help="Start of the run (timestamp)")
+    snapshot_id = fields.Many2one(
+        'google.spreadsheet.snapshot',
+        string='Snapshot',
+        ondelete='set null',
+        help="Snapshot read by the import jobs of the run")
+    prerequisite_run_ids = fields.Many2many(
+        'google.spreadsheet.run',
+        'google_spreadsheet_run_prerequisite_rel',
+        'run_id', 'prerequisite_id',
+        string='Prerequisite Runs',
+        help="Runs of the documents this document depends on: the import "
+             "jobs wait for their jobs to be finished")
+    job_count = fields.Integer('Jobs', compute='_compute_metrics')
+    job_done = fields.Integer('Finished Jobs', compute='_compute_metrics')
+    rows_in = fields.Integer('Rows Read', compute='_compute_metrics')
+    rows_skipped = fields.Integer('Rows Skipped', compute='_compute_metrics')
+    rows_written = fields.Integer('Rows Written', compute='_compute_metrics')
+    duration_p50 = fields.Float('Job p50 (s)', compute='_compute_metrics')
+    duration_p95 = fields.Float('Job p95 (s)', compute='_compute_metrics')
+    rows_per_second = fields.Float('Rows/s', compute='_compute_metrics')
+    last_committed_row = fields.Integer(
+        compute='_compute_metrics',
+        help="Last row of the chunks done without interruption from the "
+             "first row: the import can resume after it")
+    time_total = fields.Float(
+        'Total (s)', compute='_compute_metrics',
+        help="From the start of the run to the end of its last job")
+    time_auth = fields.Float('Authorization (s)', compute='_compute_metrics')
+    time_fetch = fields.Float('Fetch (s)', compute='_compute_metrics')
+    time_match = fields.Float('Field Matching (s)',
+                              compute='_compute_metrics')
+    time_convert = fields.Float('Conversion (s)', compute='_compute_metrics')
+    time_load = fields.Float('Load (s)', compute='_compute_metrics')
+    time_write_back = fields.Float('Errors Write-Back (s)',
+                                   compute='_compute_metrics')
+    write_back_failed = fields.Integer(
+        'Failed Write-Backs', compute='_compute_metrics',
+        help="Chunks whose errors could not be written in the sheet")
+
+    @api.multi
+    @api.depends('chunk_ids')
+    def _compute_metrics(self):
+        for run in self:
+            # (the chunks resumed by parts are done, their parts are not)
+            not_done = run.chunk_ids.filtered(lambda c: c.state != 'done')
+            if not_done:
+                run.last_committed_row = min(
+                    not_done.mapped('row_start')) - 1
+            else:
+                run.last_committed_row = max(
+                    run.chunk_ids.mapped('row_end') or [run.row_start - 1])
+            finished = run.chunk_ids.filtered('date_end')
+            durations = [chunk.duration for chunk in finished]
+            run.job_count = len(run.chunk_ids)
+            run.job_done = len(finished)
+            run.rows_in = sum(finished.mapped('rows_in'))
+            run.rows_skipped = sum(finished.mapped('rows_skipped'))
+            run.rows_written = sum(finished.mapped('rows_written'))
+            run.duration_p50 = percentile(durations, 50)
+            run.duration_p95 = percentile(durations, 95)
+            run.write_back_failed = len(
+                run.chunk_ids.filtered('write_back_error'))
+            for key in CHUNK_TIMINGS:
+                run[key] = sum(finished.mapped(key))
+            if finished:
+                # wall clock time: the jobs may run concurrently
+                elapsed = (max(finished.mapped('date_end')) -
+                           min(finished.mapped('date_start')))
+                run.rows_per_second = run.rows_in / elapsed if elapsed \
+                    else 0.0
+                if run.date_start:
+                    run.time_total = (max(finished.mapped('date_end')) -
+                                      run.date_start)
+
+    @api.multi
+    def pending_jobs(self):
+        """ Return the import jobs of the runs which are not finished """
+        return self.env['queue.job'].search([
+            ('uuid', 'in', self.mapped('chunk_ids.job_uuid')),
+            ('state', 'not in', ('done', 'failed')),
+        ])
+
+    @api.multi
+    def collect_errors(self):
+        """ Return the errors recorded by the chunks: {row: message} """
+        self.ensure_one()
+        row_errors = {}
+        for chunk in self.chunk_ids:
+            if chunk.errors:
+                row_errors.update(
+                    (int(row), message)
+                    for row, message in json.loads(chunk.errors))
+        return row_errors
+
+
+class GoogleSpreadsheetRunChunk(models.Model):
+    _name = 'google.spreadsheet.run.chunk'
+    _description = 'Google Spreadsheet Run Chunk'
+    _order = 'row_start ASC'
+
+    run_id = fields.Many2one(
+        'google.spreadsheet.run',
+        string='Run',
+        required=True,
+        index=True,
+        ondelete='cascade')
+    row_start = fields.Integer('First Row')
+    row_end = fields.Integer('Last Row')
+    job_uuid = fields.Char('Job UUID', index=True)
+    state = fields.Selection(
+        selection=[('pending', 'Pending'),
+                   ('done', 'Done'),
+                   ('failed', 'Failed')],
+        default='pending',
+        required=True,
+        help="Pending until the import job records its result")
+    job_args = fields.Text(
+        help="Arguments of the import job (JSON), to queue it again")
+    retry_ranges = fields.Text(
+        help="Rows (JSON list of [first, last]) of the one2many groups in "
+             "error of a chunk whose other rows were imported (Isolate "
+             "Failing Rows): only these rows are imported again")
+    errors = fields.Text(help="Errors of the rows (JSON)")
+    write_back_error = fields.Text(
+        'Errors Write-Back Failure',
+        help="Why the errors of the rows could not be written in the "
+             "ERRORS column of the sheet by the writer thread")
+    date_start = fields.Float(help="Start of the job (timestamp)")
+    date_end = fields.Float(help="End of the job (timestamp)")
+    duration = fields.Float('Duration (s)')
+    rows_in = fields.Integer('Rows Read')
+    rows_skipped = fields.Integer('Rows Skipped')
+    rows_written = fields.Integer('Rows Written')
+    time_auth = fields.Float('Authorization (s)')
+    time_fetch = fields.Float('Fetch (s)')
+    time_match = fields.Float('Field Matching (s)')
+    time_convert = fields.Float('Conversion (s)')
+    time_load = fields.Float('Load (s)')
+    time_write_back = fields.Float('Errors Write-Back (s)')
+
+    @api.model
+    def record_result(self, chunk_id, vals, row_errors=None,
+                      own_transaction=False):
+        """ Record the metrics (and errors) of an import job
+
+        :param own_transaction: write them in a transaction of their own,
+                                for a failed job, which rollbacks its
+                                cursor; else they are committed with the
+                                rows imported by the job
+        """
+        vals = dict(vals)
+        if row_errors is not None:
+            vals['errors'] = json.dumps(sorted(row_errors.items()))
+        if own_transaction:
+            write_chunk_values(self.env.cr.dbname, chunk_id, vals)
+        else:
+            # (nothing to record when the run was deleted meanwhile)
+            self.browse(chunk_id).exists().write(vals)
+        return True
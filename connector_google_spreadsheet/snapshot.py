@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+import base64
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from openerp import models, fields, api
+
+# rows stored per compressed block: an import job only decompresses
+# the blocks overlapping its chunk
+SNAPSHOT_BLOCK_ROWS = 500
+SNAPSHOT_RETENTION_DAYS = 7
+
+
+def pack_rows(rows):
+    return base64.b64encode(zlib.compress(json.dumps(rows), 6))
+
+
+def unpack_rows(data):
+    return json.loads(zlib.decompress(base64.b64decode(data)))
+
+
+class GoogleSpreadsheetSnapshot(models.Model):
+    _name = 'google.spreadsheet.snapshot'
+    _description = 'Google Spreadsheet Snapshot'
+    _order = 'create_date DESC'
+
+    document_id = fields.Many2one(
+        'google.spreadsheet.document',
+        string='Spreadsheet Document',
+        required=True,
+        ondelete='cascade')
+    document_sheet = fields.Char('Sheet Name', required=True)
+    revision = fields.Char(
+        required=True,
+        help="Last update time of the sheet when the snapshot was taken")
+    row_count = fields.Integer('Rows')
+    col_count = fields.Integer('Columns')
+    block_ids = fields.One2many(
+        'google.spreadsheet.snapshot.block',
+        'snapshot_id', string='Blocks')
+
+    _sql_constraints = [
+        ('revision_uniq', 'unique(document_id, document_sheet, revision)',
+         "A snapshot already exists for this sheet revision"),
+    ]
+
+    @api.model
+    def find(self, document, sheet_name, revision):
+        return self.search([('document_id', '=', document.id),
+                            ('document_sheet', '=', sheet_name),
+                            ('revision', '=', revision)], limit=1)
+
+    @api.model
+    def store(self, document, sheet_name, revision, rows):
+        """ Store the cell values of a whole sheet (list of rows as
+            returned by gspread ``get_all_values``) in compressed blocks
+        """
+        self._purge(document, sheet_name)
+        col_count = max([len(row) for row in rows] or [0])
+        snapshot = self.create({
+            'document_id': document.id,
+            'document_sheet': sheet_name,
+            'revision': revision,
+            'row_count': len(rows),
+            'col_count': col_count,
+        })
+        block_obj = self.env['google.spreadsheet.snapshot.block']
+        for index in range(0, len(rows), SNAPSHOT_BLOCK_ROWS):
+            block_obj.create({
+                'snapshot_id': snapshot.id,
+                'row_start': index + 1,
+                'data': pack_rows(rows[index:index + SNAPSHOT_BLOCK_ROWS]),
+            })
+        return snapshot
+
+    def _purge(self, document, sheet_name):
+        """ Delete the old snapshots of a sheet, except the ones read by
+            import jobs not finished yet (queued or resumed)
+        """
+        limit = datetime.now() - timedelta(days=SNAPSHOT_RETENTION_DAYS)
+        snapshots = self.search([
+            ('document_id', '=', document.id),
+            ('document_sheet', '=', sheet_name),
+            ('create_date', '<', fields.Datetime.to_string(limit)),
+        ])
+        in_use = self.env['google.spreadsheet.run.chunk'].search([
+            ('run_id.snapshot_id', 'in', snapshots.ids),
+            ('state', '=', 'pending'),
+        ]).mapped('run_id.snapshot_id')
+        (snapshots - in_use).unlink()
+
+    @api.multi
+    def read_rows(self, row_start, row_end, col_start=1, col_end=None):
+        """ Return the values between rows and columns (1-based, included)
+            as a dense list of lists padded with empty strings
+        """
+        self.ensure_one()
+        if col_end is None:
+            col_end = self.col_count
+        first_block = (row_start - 1) // SNAPSHOT_BLOCK_ROWS
+        first_block_row = first_block * SNAPSHOT_BLOCK_ROWS + 1
+        self.env.cr.execute(
+            "SELECT data FROM google_spreadsheet_snapshot_block "
+            "WHERE snapshot_id = %s AND row_start >= %s AND row_start <= %s "
+            "ORDER BY row_start",
+            (self.id, first_block_row, row_end))
+        rows = []
+        for data, in self.env.cr.fetchall():
+            rows.extend(unpack_rows(str(data)))
+        rows = rows[row_start - first_block_row:row_end - first_block_row + 1]
+        width = col_end - col_start + 1
+        data = []
+        for row in rows:
+            row = row[col_start - 1:col_end]
+            row.extend([''] * (width - len(row)))
+            data.append(row)
+        # rows beyond the snapshot are blank
+        data.extend([[''] * width
+                     for __ in range(row_end - row_start + 1 - len(data))])
+        return data
+
+
+class GoogleSpreadsheetSnapshotBlock(models.Model):
+    _name = 'google.spreadsheet.snapshot.block'
+    _description = 'Google Spreadsheet Snapshot Block'
+    _order = 'row_start ASC'
+
+    snapshot_id = fields.Many2one(
+        'google.spreadsheet.snapshot',
+        string='Snapshot',
+        required=True,
+        index=True,
+        ondelete='cascade')
+    row_start = fields.Integer('First Row', required=True)
+    data = fields.Binary('Compressed Values')
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Spreadsheet sources: where documents are read and written
+
+A source opens a document from its URL. Documents, worksheets and cells
+have the interface of gspread objects used by the import:
+
+- document: ``worksheet(title)``, ``worksheets()``
+- worksheet: ``row_count``, ``col_count``, ``updated``,
+  ``get_addr_int(row, col)``, ``range(label)``, ``get_all_values()``,
+  ``update_cells(cells)``, ``resize(rows, cols)``
+- cell: ``row``, ``col``, ``value``
+"""
+
+import functools
+import os
+from urlparse import urlparse
+
+from openerp import _
+from openerp.tools import config
+
+from .connection import client_pool
+from .local_source import LocalDocument, LocalSourceError
+from .reader import iter_cells
+
+
+class SpreadsheetSource(object):
+    """ Base class of the sources """
+
+    def open(self, backend, document_url):
+        raise NotImplementedError
+
+    def opener(self, backend, document_url):
+        """ Return a function opening the document, which may be called
+            by other threads: it must not use the ORM
+        """
+        return functools.partial(self.open, backend, document_url)
+
+    def error_message(self, backend, error):
+        """ Message shown to the user when a document can not be opened """
+        return _("Google Drive: %s" % error.message)
+
+    def has_values(self, sheet, row_start, row_end, col_start, col_end):
+        """ Tell if a cell between rows and columns has a value """
+        for cell in iter_cells(sheet, row_start, row_end, col_start,
+                               col_end):
+            if cell.value:
+                return True
+        return False
+
+
+class GspreadSource(SpreadsheetSource):
+    """ Google Spreadsheets through gspread """
+
+    def open(self, backend, document_url):
+        return self.opener(backend, document_url)()
+
+    def opener(self, backend, document_url):
+        # authorized clients and opened documents are reused by the
+        # following calls of the process (per thread)
+        get_client = client_pool.client_factory(backend)
+
+        def open_document():
+            gc, documents = get_client()
+            document = documents.get(document_url)
+            if document is None:
+                document = documents[document_url] = gc.open_by_url(
+                    document_url)
+            else:
+                # gspread keeps the worksheets feed of the first call of
+                # worksheet(s)(): forget it, so that the size, revision
+                # and list of the tabs are read again (one request)
+                document._sheet_list = []
+            return document
+        return open_document
+
+    def error_message(self, backend, error):
+        if isinstance(error, ImportError):
+            # the Google client stack is imported on first use
+            return _("Missing Python dependency: %s\n\nInstall pyOpenSSL, "
+                     "oauth2client and gspread") % error.message
+        from httplib2 import ServerNotFoundError
+        from gspread.exceptions import NoValidUrlKeyFound, SpreadsheetNotFound
+        if isinstance(error, ServerNotFoundError):
+            return _("Check your internet connection.\n"
+                     "Impossible to establish a connection "
+                     "with Google Services")
+        if isinstance(error, NoValidUrlKeyFound):
+            return _('Google Drive: No valid key found in URL')
+        if isinstance(error, SpreadsheetNotFound):
+            return _("Spreadsheet Not Found"
+                     "\n\nResolution\n----------------\n"
+                     "Check URL file & sharing options with it "
+                     "with this google user:\n\n%s" % backend.email)
+        return super(GspreadSource, self).error_message(backend, error)
+
+    def has_values(self, sheet, row_start, row_end, col_start, col_end):
+        from gspread.ns import _ns
+        # without 'return-empty', the cells feed only lists the filled
+        # cells: a small request whatever the number of rows
+        feed = sheet.client.get_cells_feed(sheet, params={
+            'range': sheet.get_addr_int(row_start, col_start) + ':' +
+            sheet.get_addr_int(row_end, col_end),
+            'max-results': 1,
+        })
+        return feed.find(_ns('entry')) is not None
+
+
+class LocalFileSource(SpreadsheetSource):
+    """ CSV/XLSX/ODS files of the server (file:// URLs), only inside the
+        directory of the 'google_spreadsheet_local_dir' server option
+    """
+
+    def open(self, backend, document_url):
+        root = config.get('google_spreadsheet_local_dir')
+        if not root:
+            raise LocalSourceError(
+                "Local files are disabled: set the "
+                "'google_spreadsheet_local_dir' server option")
+        root = os.path.realpath(root)
+        path = os.path.realpath(urlparse(document_url).path)
+        if not path.startswith(root + os.sep):
+            raise LocalSourceError('%s is not inside %s' % (path, root))
+        # the simulated quota errors are retried as the Google ones
+        from .throttle import retry_request
+        return LocalDocument(document_url, retry=retry_request)
+
+
+# URL scheme: source, the default one being used for other schemes
+SOURCES = {
+    'file': LocalFileSource(),
+}
+DEFAULT_SOURCE = GspreadSource()
+
+
+def get_source(document_url):
+    return SOURCES.get(urlparse(document_url or '').scheme, DEFAULT_SOURCE)
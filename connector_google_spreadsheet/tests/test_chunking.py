@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+import unittest
+
+from ..chunking import plan_chunks, plan_group_chunks, row_groups, split_point
+from ..reader import find_data_end, read_columns, scan_data_rows
+
+FLAT = [['a'], ['b'], ['c'], ['d'], ['e']]
+ONE2MANY = [['SO1', 'a'], ['', 'b'], ['', 'c'], ['SO2', 'd'], ['SO3', 'e'],
+            ['', 'f'], ['SO4', 'g']]
+
+
+class TestScanDataRows(unittest.TestCase):
+
+    def test_first_column_then_other_columns(self):
+        rows = [['SO1', 'a'], ['', 'b'], ['SO2', 'c'], ['', 'd'],
+                ['', ''], ['', 'e'], ['', '']]
+        cells, first_column_rows, last_row = scan_data_rows(rows)
+        self.assertEqual(first_column_rows, 3)
+        self.assertEqual(last_row, 6)
+        # first column flags, then the rows with any value
+        self.assertEqual(list(cells), [1, 0, 1, 1, 0, 1])
+
+    def test_blank(self):
+        cells, first_column_rows, last_row = scan_data_rows(
+            [['', ''], ['', '']])
+        self.assertEqual((list(cells), first_column_rows, last_row),
+                         ([], 0, 0))
+
+
+class TestPlanChunks(unittest.TestCase):
+
+    # (rows, data_row_start, eof (None: last row), chunk_size, ranges)
+    CASES = [
+        (FLAT, 2, None, 2, [(2, 3), (4, 5), (6, 6)]),
+        (FLAT, 2, None, 1, [(2, 2), (3, 3), (4, 4), (5, 5), (6, 6)]),
+        (FLAT, 2, None, 0, [(2, 2), (3, 3), (4, 4), (5, 5), (6, 6)]),
+        (FLAT, 2, None, 10, [(2, 6)]),
+        (FLAT, 4, None, 2, [(4, 5), (6, 6)]),
+        # a chunk is only cut before a root of a one2many group
+        (ONE2MANY, 2, None, 2, [(2, 4), (5, 7), (8, 8)]),
+        (ONE2MANY, 2, None, 1, [(2, 4), (5, 5), (6, 7), (8, 8)]),
+        (ONE2MANY, 2, None, 0, [(2, 4), (5, 5), (6, 7), (8, 8)]),
+        # the first chunk starts on a child row
+        (ONE2MANY, 3, None, 2, [(3, 4), (5, 7), (8, 8)]),
+        # the last chunk is cut at eof
+        (ONE2MANY, 2, 6, 2, [(2, 4), (5, 6)]),
+        (ONE2MANY, 2, 3, 10, [(2, 3)]),
+    ]
+
+    def test_cases(self):
+        for rows, data_row_start, eof, chunk_size, ranges in self.CASES:
+            cells, __, last_row = scan_data_rows(rows)
+            if eof is None:
+                eof = 1 + last_row
+            self.assertEqual(
+                plan_chunks(cells, 2, data_row_start, eof, chunk_size),
+                ranges, (rows, data_row_start, eof, chunk_size))
+
+
+class TestRowGroups(unittest.TestCase):
+
+    def groups(self, rows, data_row_start=2, eof=None):
+        cells, first_column_rows, last_row = scan_data_rows(rows)
+        if eof is None:
+            eof = 1 + last_row
+        return row_groups(cells, 2, data_row_start, eof, first_column_rows)
+
+    def test_children_of_the_last_group(self):
+        rows = [['SO1', 'a'], ['', 'b'], ['SO2', 'c'], ['', 'd'],
+                ['', 'e']]
+        self.assertEqual(self.groups(rows), [(2, 3), (4, 6)])
+
+    def test_blank_rows_inside_groups(self):
+        rows = [['SO1', 'a'], ['', ''], ['', 'b'], ['SO2', 'c'],
+                ['', ''], ['', 'd']]
+        self.assertEqual(self.groups(rows), [(2, 4), (5, 7)])
+
+    def test_data_row_start_on_a_child_row(self):
+        rows = [['SO1', 'a'], ['', 'b'], ['', 'c'], ['SO2', 'd']]
+        self.assertEqual(self.groups(rows, data_row_start=3),
+                         [(3, 4), (5, 5)])
+
+    def test_flat_rows(self):
+        rows = [['a'], ['b'], ['c']]
+        self.assertEqual(self.groups(rows), [(2, 2), (3, 3), (4, 4)])
+
+
+class TestPlanGroupChunks(unittest.TestCase):
+
+    def test_gather_up_to_chunk_size(self):
+        groups = [(2, 3), (4, 4), (5, 7), (8, 8)]
+        self.assertEqual(plan_group_chunks(groups, 3),
+                         [[(2, 3), (4, 4)], [(5, 7)], [(8, 8)]])
+
+    def test_never_split_a_group(self):
+        self.assertEqual(plan_group_chunks([(2, 11)], 3), [[(2, 11)]])
+
+    def test_only_contiguous_groups(self):
+        groups = [(2, 2), (5, 6), (7, 7)]
+        self.assertEqual(plan_group_chunks(groups, 10),
+                         [[(2, 2)], [(5, 6), (7, 7)]])
+
+    def test_no_group(self):
+        self.assertEqual(plan_group_chunks([], 5), [])
+
+
+class TestSplitPoint(unittest.TestCase):
+
+    # (group starts, start, stop, split point)
+    CASES = [
+        ([0, 3, 4, 6], 0, 7, 3),
+        ([0, 2, 5], 0, 5, 2),
+        ([0, 2, 5], 2, 7, 5),
+        # a single group can not be split
+        ([0], 0, 5, None),
+        ([0, 3, 4, 6], 4, 6, None),
+    ]
+
+    def test_cases(self):
+        for starts, start, stop, point in self.CASES:
+            self.assertEqual(split_point(starts, start, stop), point,
+                             (starts, start, stop))
+
+
+class TestFindDataEnd(unittest.TestCase):
+
+    def find(self, last_row, row_end, window):
+        """ Return the data end found for values up to ``last_row`` and
+            the number of probes
+        """
+        probes = []
+
+        def has_values(start, stop):
+            probes.append((start, stop))
+            return start <= last_row
+        return find_data_end(2, row_end, has_values, window), len(probes)
+
+    def test_large_blank_tail(self):
+        data_end, probes = self.find(1234, 100000, 500)
+        self.assertTrue(1234 <= data_end < 1234 + 500)
+        self.assertTrue(probes <= 16)
+
+    def test_no_blank_tail(self):
+        self.assertEqual(self.find(300, 300, 500), (300, 1))
+
+    def test_all_blank(self):
+        self.assertEqual(self.find(0, 100, 500)[0], 1)
+
+    def test_exact_with_a_window_of_one_row(self):
+        self.assertEqual(self.find(7, 10, 1)[0], 7)
+
+
+class Cell(object):
+
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeSheet(object):
+    """ ``range`` returns the cells of a grid, in the order given by
+        ``order``
+    """
+
+    def __init__(self, grid, order=None):
+        self.grid = grid
+        self.order = order
+
+    def get_addr_int(self, row, col):
+        return '%s,%s' % (row, col)
+
+    def range(self, label):
+        row_start, col_start, row_end, col_end = map(
+            int, label.replace(':', ',').split(','))
+        cells = [Cell(row, col, self.grid[row - 1][col - 1])
+                 for row in range(row_start, row_end + 1)
+                 for col in range(col_start, col_end + 1)]
+        return self.order(cells) if self.order else cells
+
+
+class TestReadColumns(unittest.TestCase):
+
+    GRID = [['h1', 'h2', 'h3'],
+            ['a', None, 'x'],
+            ['', 'b', 'y'],
+            ['c', 'd', None]]
+
+    def test_full_grid(self):
+        self.assertEqual(
+            read_columns(FakeSheet(self.GRID), 2, 4, 1, 3, window=2),
+            [['a', '', 'c'], ['', 'b', 'd'], ['x', 'y', '']])
+
+    def test_cells_out_of_order_or_missing(self):
+        # (the blank cells are not listed)
+        def order(cells):
+            return [cell for cell in reversed(cells) if cell.value]
+        self.assertEqual(
+            read_columns(FakeSheet(self.GRID, order), 2, 4, 1, 3, window=2),
+            [['a', '', 'c'], ['', 'b', 'd'], ['x', 'y', '']])
+
+    def test_wanted_columns(self):
+        for order in (None, lambda cells: cells[::-1]):
+            self.assertEqual(
+                read_columns(FakeSheet(self.GRID, order), 2, 4, 2, 3,
+                             wanted=[False, True]),
+                [None, ['x', 'y', '']])
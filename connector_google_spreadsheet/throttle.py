@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#   Module for Odoo
+#   Copyright (C) 2015-TODAY Akretion (http://www.akretion.com).
+#   @author Sylvain Calador <sylvain.calador@akretion.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Affero General Public License as
+#   published by the Free Software Foundation, either version 3 of the
+#   License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+import httplib
+import logging
+import random
+import socket
+import time
+from urlparse import urlparse
+
+from gspread.httpsession import HTTPSession
+from gspread.exceptions import HTTPError
+
+from openerp import registry
+from openerp.addons.connector.exception import RetryableJobError
+
+from .local_source import LocalQuotaError
+
+# Google counts the requests of a project over 100 seconds
+QUOTA_WINDOW = 100
+# above this wait, a job is postponed instead of sleeping
+MAX_BUDGET_WAIT = 20
+# retries of a request answered with a quota or server error
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+# seconds the request budget of a backend is kept by an HTTP session
+BUDGET_CACHE_DELAY = 60
+
+_logger = logging.getLogger(__name__)
+
+
+def http_status(exc):
+    """ Status of a gspread HTTPError ('429: <body>') """
+    try:
+        return int(unicode(exc).split(':', 1)[0])
+    except ValueError:
+        return None
+
+
+def is_retryable_error(exc):
+    """ Quota exceeded or temporary server error """
+    status = http_status(exc)
+    if status == 403:
+        return 'ratelimitexceeded' in unicode(exc).lower()
+    return status in (429, 500, 502, 503, 504)
+
+
+def backoff_delay(attempt):
+    """ Exponential backoff with jitter """
+    return random.uniform(0.5, 1) * min(BACKOFF_MAX,
+                                        BACKOFF_BASE * 2 ** attempt)
+
+
+def retry_request(send, wait_budget=None, drop_connection=None):
+    """ Return ``send()``, retried with an exponential backoff while it
+        fails because of quotas (gspread or simulated by the local files)
+        or broken connections
+
+    :param wait_budget: function called before each attempt
+    :param drop_connection: function called when the connection broke
+    """
+    attempt = 0
+    while True:
+        if wait_budget:
+            wait_budget()
+        try:
+            return send()
+        except (HTTPError, LocalQuotaError) as exc:
+            if not is_retryable_error(exc):
+                raise
+            if attempt + 1 >= MAX_ATTEMPTS:
+                raise RetryableJobError(
+                    'Google API: %s' % exc,
+                    seconds=int(backoff_delay(attempt + 1)) + 1)
+        except (httplib.HTTPException, socket.error):
+            if drop_connection:
+                drop_connection()
+            if attempt + 1 >= MAX_ATTEMPTS:
+                raise
+        delay = backoff_delay(attempt)
+        _logger.info('Google API request failed, retry in %.1fs', delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+def read_request_budget(dbname, backend_id):
+    """ Return the request budget of the backend (0: no limit) """
+    cr = registry(dbname).cursor()
+    try:
+        cr.execute(
+            "SELECT request_budget FROM google_spreadsheet_backend "
+            "WHERE id = %s", (backend_id,))
+        row = cr.fetchone()
+        return row and row[0] or 0
+    finally:
+        cr.close()
+
+
+def consume_request_budget(dbname, backend_id):
+    """ Count a request in the budget of the backend shared by all the
+        processes: return the seconds to wait when it is exhausted
+    """
+    cr = registry(dbname).cursor()
+    try:
+        cr.execute(
+            "SELECT request_budget, quota_window_start, quota_used "
+            "FROM google_spreadsheet_backend WHERE id = %s FOR UPDATE",
+            (backend_id,))
+        row = cr.fetchone()
+        if not row or not row[0]:
+            return 0
+        budget, window_start, used = row
+        now = time.time()
+        if not window_start or now - window_start >= QUOTA_WINDOW:
+            window_start, used = now, 0
+        if used >= budget:
+            return window_start + QUOTA_WINDOW - now
+        cr.execute(
+            "UPDATE google_spreadsheet_backend "
+            "SET quota_window_start = %s, quota_used = %s WHERE id = %s",
+            (window_start, used + 1, backend_id))
+        return 0
+    finally:
+        cr.commit()
+        cr.close()
+
+
+class ThrottledHTTPSession(HTTPSession):
+    """ gspread HTTP session respecting the request budget of a backend,
+        and retrying the requests failing because of quotas or broken
+        connections
+    """
+
+    def __init__(self, dbname, backend_id, headers=None):
+        super(ThrottledHTTPSession, self).__init__(headers=headers)
+        self.dbname = dbname
+        self.backend_id = backend_id
+        self._budget = None
+        self._budget_date = 0
+
+    def _request_budget(self):
+        now = time.time()
+        if self._budget is None or \
+                now - self._budget_date >= BUDGET_CACHE_DELAY:
+            self._budget = read_request_budget(self.dbname, self.backend_id)
+            self._budget_date = now
+        return self._budget
+
+    def _wait_budget(self):
+        if not self._request_budget():
+            # no limit: no lock shared by the workers
+            return
+        while True:
+            wait = consume_request_budget(self.dbname, self.backend_id)
+            if not wait:
+                return
+            if wait > MAX_BUDGET_WAIT:
+                raise RetryableJobError(
+                    'Google request budget exhausted', seconds=int(wait) + 1)
+            time.sleep(wait)
+
+    def request(self, method, url, data=None, headers=None):
+        def drop_connection():
+            # a kept-alive connection closed by Google
+            uri = urlparse(url)
+            self.connections.pop(uri.scheme + uri.netloc, None)
+        return retry_request(
+            lambda: super(ThrottledHTTPSession, self).request(
+                method, url, data=data, headers=headers),
+            wait_budget=self._wait_budget, drop_connection=drop_connection)